@@ -1,57 +1,120 @@
 """Enhanced Midjourney Assistant Tool v3.0 with comprehensive improvements."""
 import os
 import json
-import random
+import time
 import logging
+import argparse
+import threading
+from contextlib import contextmanager
 import tkinter as tk
-from tkinter import ttk, scrolledtext, messagebox, filedialog
+from tkinter import ttk, scrolledtext, messagebox, filedialog, simpledialog
 from typing import Dict, List, Optional
 
 # Import our new modules
 from config_manager import ConfigManager, ConfigData
 from style_manager import StyleManager
+from style_importer import StyleImporter
+from style_similarity import SIMILARITY_AVAILABLE
 from prompt_manager import PromptManager, PromptTemplate, PromptHistoryItem
+from persistence import atomic_write, sync_pending
 from ui_components import (TooltipManager, StatusBar, SearchableListbox, 
-                          TabManager, AdvancedParameterFrame, ThemeManager)
+                          TabManager, AdvancedParameterFrame, ThemeManager,
+                          SearchWorker, VirtualListbox, PagedSequence)
+
+class StartupProfiler:
+    """Logs how long each startup phase takes when enabled."""
+    
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.logger = logging.getLogger(__name__)
+        self._start = time.perf_counter()
+    
+    @contextmanager
+    def phase(self, name: str):
+        """Time the enclosed block as one named phase."""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.logger.info(f"Startup phase '{name}': {(time.perf_counter() - start) * 1000:.1f} ms")
+    
+    def mark(self, name: str):
+        """Log the time elapsed since the profiler was created."""
+        if self.enabled:
+            self.logger.info(f"Startup milestone '{name}': {(time.perf_counter() - self._start) * 1000:.1f} ms")
 
 class EnhancedMATGUI:
     """Enhanced Midjourney Assistant Tool with comprehensive improvements."""
     
-    def __init__(self, root):
+    def __init__(self, root, startup_profile: bool = False):
         self.root = root
         self.setup_logging()
         self.logger = logging.getLogger(__name__)
+        self.profiler = StartupProfiler(startup_profile)
         
         # Initialize managers
         self.base_path = os.path.dirname(__file__)
         self.config_manager = ConfigManager(os.path.join(self.base_path, "config.json"))
-        self.style_manager = StyleManager(os.path.join(self.base_path, "Styles"))
-        self.prompt_manager = PromptManager(os.path.join(self.base_path, "data"))
-        self.theme_manager = ThemeManager()
-        self.tooltip_manager = TooltipManager()
         
         # Load configuration
-        self.config = self.config_manager.load_config()
+        with self.profiler.phase("load config"):
+            self.config = self.config_manager.load_config()
+        
+        with self.profiler.phase("load style catalog"):
+            self.style_manager = StyleManager(os.path.join(self.base_path, "Styles"),
+                                              self.config.style_cache_max_entries,
+                                              self.config.style_cache_max_bytes)
+        # Templates and history are loaded on first use
+        self._prompt_manager: Optional[PromptManager] = None
+        self.theme_manager = ThemeManager()
+        self.tooltip_manager = TooltipManager()
         
         # Setup window
-        self.setup_window()
-        self.setup_theme()
+        with self.profiler.phase("setup window"):
+            self.setup_window()
+            self.setup_theme()
         
         # UI Variables
         self.setup_variables()
         
+        # Background search workers
+        self.style_search_worker = SearchWorker(self.root)
+        self.history_search_worker = SearchWorker(self.root)
+        
         # Create UI
-        self.create_main_ui()
-        self.setup_keybindings()
+        with self.profiler.phase("build prompt builder"):
+            self.create_main_ui()
+            self.setup_keybindings()
         
         # Load initial data
-        self.load_initial_data()
+        with self.profiler.phase("load initial data"):
+            self.load_initial_data()
         
         # Start auto-save
         self.start_auto_save()
         
+        # Watch the Styles folder for edits
+        self.start_style_watcher()
+        
+        # Warm the remaining categories and the search index once the window is up
+        self.root.after_idle(self.start_prefetch)
+        self.root.after_idle(lambda: self.profiler.mark("window ready"))
+        
         self.logger.info("Enhanced MAT GUI initialized successfully")
     
+    @property
+    def prompt_manager(self) -> PromptManager:
+        """Prompt templates and history, loaded on first access."""
+        if self._prompt_manager is None:
+            with self.profiler.phase("load templates and history"):
+                self._prompt_manager = PromptManager(os.path.join(self.base_path, "data"),
+                                                     max_history=self.config.max_history,
+                                                     backend=self.config.storage_backend)
+        return self._prompt_manager
+    
     def setup_logging(self):
         """Setup logging configuration."""
         log_file = os.path.join(os.path.dirname(__file__), "mat.log")
@@ -134,11 +197,17 @@ class EnhancedMATGUI:
         # Create tab manager
         self.tab_manager = TabManager(main_frame)
         
-        # Create tabs
+        # Create tabs; all but the Prompt Builder are built on first selection
         self.create_prompt_tab()
-        self.create_templates_tab()
-        self.create_history_tab()
-        self.create_settings_tab()
+        self._lazy_tabs = {
+            "templates": self.create_templates_tab,
+            "history": self.create_history_tab,
+            "settings": self.create_settings_tab
+        }
+        for name, text in [("templates", "Templates"), ("history", "History"), ("settings", "Settings")]:
+            frame = tk.Frame(self.root, bg=self.theme_manager.get_theme()["bg"])
+            self.tab_manager.add_tab(name, frame, text)
+        self.tab_manager.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
         
         self.tab_manager.pack(fill=tk.BOTH, expand=True)
         
@@ -200,11 +269,38 @@ class EnhancedMATGUI:
         self.category_combo.pack(fill=tk.X, padx=5, pady=2)
         self.category_combo.bind("<<ComboboxSelected>>", self.on_category_change)
         
+        # Catalog-wide search
+        tk.Label(style_frame, text="Search all categories:", bg=self.theme_manager.get_theme()["bg"], 
+                fg=self.theme_manager.get_theme()["fg"]).pack(anchor=tk.W, padx=5, pady=(10,2))
+        
+        self.catalog_search_var = tk.StringVar()
+        catalog_search_entry = tk.Entry(style_frame, textvariable=self.catalog_search_var,
+                                       bg=self.theme_manager.get_theme()["entry_bg"], 
+                                       fg=self.theme_manager.get_theme()["entry_fg"])
+        catalog_search_entry.pack(fill=tk.X, padx=5, pady=2)
+        catalog_search_entry.bind("<Return>", lambda e: self.search_all_styles())
+        self.tooltip_manager.add_tooltip(catalog_search_entry, "Press Enter to search every category")
+        
+        # Tag filter
+        tk.Label(style_frame, text="Filter by tags:", bg=self.theme_manager.get_theme()["bg"], 
+                fg=self.theme_manager.get_theme()["fg"]).pack(anchor=tk.W, padx=5, pady=(10,2))
+        
+        self.tag_filter_var = tk.StringVar()
+        tag_filter_entry = tk.Entry(style_frame, textvariable=self.tag_filter_var,
+                                   bg=self.theme_manager.get_theme()["entry_bg"], 
+                                   fg=self.theme_manager.get_theme()["entry_fg"])
+        tag_filter_entry.pack(fill=tk.X, padx=5, pady=2)
+        tag_filter_entry.bind("<Return>", lambda e: self.filter_by_tags())
+        self.tooltip_manager.add_tooltip(tag_filter_entry,
+                                         "e.g. portraits AND dark AND NOT erotic. Categories are tags too; press Enter to filter")
+        
         # Searchable style listbox
         tk.Label(style_frame, text="Styles:", bg=self.theme_manager.get_theme()["bg"], 
                 fg=self.theme_manager.get_theme()["fg"]).pack(anchor=tk.W, padx=5, pady=(10,2))
         
-        self.style_listbox = SearchableListbox(style_frame, on_select=self.on_style_select)
+        self.style_listbox = SearchableListbox(style_frame, on_select=self.on_style_select,
+                                               search_worker=self.style_search_worker,
+                                               completer=self.style_manager.get_completions)
         self.style_listbox.pack(fill=tk.BOTH, expand=True, padx=5, pady=2)
         
         # Favorites section
@@ -222,9 +318,22 @@ class EnhancedMATGUI:
                                       fg=self.theme_manager.get_theme()["fg"])
         show_favorites_btn.pack(side=tk.LEFT, padx=2)
         
+        similar_btn = tk.Button(favorites_frame, text="More Like This",
+                               command=self.show_similar_styles,
+                               bg=self.theme_manager.get_theme()["bg"], 
+                               fg=self.theme_manager.get_theme()["fg"])
+        similar_btn.pack(side=tk.LEFT, padx=2)
+        
+        tags_btn = tk.Button(favorites_frame, text="Tags...", command=self.edit_style_tags,
+                            bg=self.theme_manager.get_theme()["bg"], 
+                            fg=self.theme_manager.get_theme()["fg"])
+        tags_btn.pack(side=tk.LEFT, padx=2)
+        
         # Add tooltips
         self.tooltip_manager.add_tooltip(self.favorite_btn, "Add/Remove from favorites")
         self.tooltip_manager.add_tooltip(show_favorites_btn, "Show only favorite styles")
+        self.tooltip_manager.add_tooltip(similar_btn, "Show styles similar to the selected one from every category")
+        self.tooltip_manager.add_tooltip(tags_btn, "Edit the tags of the selected style")
     
     def create_parameters_section(self, parent):
         """Create parameters selection section with scrollable content."""
@@ -394,11 +503,8 @@ class EnhancedMATGUI:
                                         fg="orange", font=("Arial", 9))
         self.validation_label.pack(side=tk.LEFT)
     
-    def create_templates_tab(self):
+    def create_templates_tab(self, templates_frame):
         """Create templates management tab."""
-        templates_frame = tk.Frame(self.root, bg=self.theme_manager.get_theme()["bg"])
-        self.tab_manager.add_tab("templates", templates_frame, "Templates")
-        
         # Templates list
         list_frame = tk.LabelFrame(templates_frame, text="Saved Templates",
                                   bg=self.theme_manager.get_theme()["bg"], 
@@ -457,11 +563,8 @@ class EnhancedMATGUI:
                  bg=self.theme_manager.get_theme()["bg"], 
                  fg=self.theme_manager.get_theme()["fg"]).pack(side=tk.LEFT, padx=2)
     
-    def create_history_tab(self):
+    def create_history_tab(self, history_frame):
         """Create history management tab."""
-        history_frame = tk.Frame(self.root, bg=self.theme_manager.get_theme()["bg"])
-        self.tab_manager.add_tab("history", history_frame, "History")
-        
         # History list
         list_frame = tk.LabelFrame(history_frame, text="Prompt History",
                                   bg=self.theme_manager.get_theme()["bg"], 
@@ -480,25 +583,17 @@ class EnhancedMATGUI:
                                bg=self.theme_manager.get_theme()["entry_bg"], 
                                fg=self.theme_manager.get_theme()["entry_fg"])
         search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        self.history_search_var.trace('w', lambda *args: self.search_history())
         
         tk.Button(search_frame, text="Search", command=self.search_history,
                  bg=self.theme_manager.get_theme()["bg"], 
                  fg=self.theme_manager.get_theme()["fg"]).pack(side=tk.RIGHT)
         
-        # History listbox
-        history_list_frame = tk.Frame(list_frame, bg=self.theme_manager.get_theme()["bg"])
-        history_list_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
-        
-        self.history_listbox = tk.Listbox(history_list_frame, 
-                                         bg=self.theme_manager.get_theme()["bg"], 
-                                         fg=self.theme_manager.get_theme()["fg"])
-        
-        history_scrollbar = tk.Scrollbar(history_list_frame, orient=tk.VERTICAL, 
-                                        command=self.history_listbox.yview)
-        self.history_listbox.configure(yscrollcommand=history_scrollbar.set)
-        
-        self.history_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        history_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        # History listbox; rows are fetched a page at a time and formatted as they scroll into view
+        self.history_listbox = VirtualListbox(list_frame, formatter=self.format_history_item,
+                                              bg=self.theme_manager.get_theme()["bg"], 
+                                              fg=self.theme_manager.get_theme()["fg"])
+        self.history_listbox.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
         
         self.history_listbox.bind("<<ListboxSelect>>", self.on_history_select)
         self.history_listbox.bind("<Double-Button-1>", self.load_from_history)
@@ -515,15 +610,16 @@ class EnhancedMATGUI:
                  bg=self.theme_manager.get_theme()["bg"], 
                  fg=self.theme_manager.get_theme()["fg"]).pack(side=tk.LEFT, padx=2)
         
+        tk.Button(history_actions, text="Most Reused", command=self.show_most_reused,
+                 bg=self.theme_manager.get_theme()["bg"], 
+                 fg=self.theme_manager.get_theme()["fg"]).pack(side=tk.LEFT, padx=2)
+        
         tk.Button(history_actions, text="Clear History", command=self.clear_history,
                  bg=self.theme_manager.get_theme()["bg"], 
                  fg=self.theme_manager.get_theme()["fg"]).pack(side=tk.RIGHT, padx=2)
     
-    def create_settings_tab(self):
+    def create_settings_tab(self, settings_frame):
         """Create settings tab."""
-        settings_frame = tk.Frame(self.root, bg=self.theme_manager.get_theme()["bg"])
-        self.tab_manager.add_tab("settings", settings_frame, "Settings")
-        
         # Theme settings
         theme_frame = tk.LabelFrame(settings_frame, text="Appearance",
                                    bg=self.theme_manager.get_theme()["bg"], 
@@ -557,6 +653,23 @@ class EnhancedMATGUI:
                                   fg=self.theme_manager.get_theme()["entry_fg"])
         autosave_spin.pack(side=tk.LEFT, padx=5)
         
+        # History retention
+        history_frame = tk.LabelFrame(settings_frame, text="History",
+                                     bg=self.theme_manager.get_theme()["bg"], 
+                                     fg=self.theme_manager.get_theme()["fg"])
+        history_frame.pack(fill=tk.X, padx=10, pady=10)
+        
+        tk.Label(history_frame, text="Keep last (prompts, 0 = all):", 
+                bg=self.theme_manager.get_theme()["bg"], 
+                fg=self.theme_manager.get_theme()["fg"]).pack(side=tk.LEFT, padx=5)
+        
+        self.max_history_var = tk.IntVar(value=self.config.max_history)
+        max_history_spin = tk.Spinbox(history_frame, from_=0, to=10000000, increment=1000,
+                                     textvariable=self.max_history_var, width=10,
+                                     bg=self.theme_manager.get_theme()["entry_bg"], 
+                                     fg=self.theme_manager.get_theme()["entry_fg"])
+        max_history_spin.pack(side=tk.LEFT, padx=5)
+        
         # Settings actions
         settings_actions = tk.Frame(settings_frame, bg=self.theme_manager.get_theme()["bg"])
         settings_actions.pack(fill=tk.X, padx=10, pady=20)
@@ -573,6 +686,28 @@ class EnhancedMATGUI:
                  bg=self.theme_manager.get_theme()["bg"], 
                  fg=self.theme_manager.get_theme()["fg"]).pack(side=tk.RIGHT, padx=5)
     
+    def ensure_tab(self, name: str) -> None:
+        """Build a lazily created tab and load its data if that has not happened yet."""
+        builder = self._lazy_tabs.pop(name, None)
+        if builder is None:
+            return
+        with self.profiler.phase(f"build {name} tab"):
+            builder(self.tab_manager.get_tab(name))
+            if name == "templates":
+                self.refresh_templates_list()
+            elif name == "history":
+                self.refresh_history_list()
+    
+    def is_tab_built(self, name: str) -> bool:
+        """Whether a lazily created tab has been built."""
+        return name not in self._lazy_tabs
+    
+    def on_tab_changed(self, event=None):
+        """Build a tab the first time it is selected."""
+        name = self.tab_manager.get_selected_tab()
+        if name:
+            self.ensure_tab(name)
+    
     def setup_keybindings(self):
         """Setup keyboard shortcuts."""
         bindings = [
@@ -609,19 +744,102 @@ class EnhancedMATGUI:
             self.category_combo.set(self.config.dropdown)
             self.on_category_change()
         
-        # Load templates
-        self.refresh_templates_list()
-        
-        # Load history
-        self.refresh_history_list()
+        # Templates and history load when their tabs are first opened
+        if self.is_tab_built("templates"):
+            self.refresh_templates_list()
+        if self.is_tab_built("history"):
+            self.refresh_history_list()
         
         # Update preview
         self.update_preview()
     
     def start_auto_save(self):
-        """Start auto-save timer."""
+        """Start auto-save timer; the first save happens one interval after startup."""
+        self.root.after(self.config.auto_save_interval, self._auto_save_tick)
+    
+    def _auto_save_tick(self):
+        """Auto-save and schedule the next run."""
         self.auto_save()
-        self.root.after(self.config.auto_save_interval, self.start_auto_save)
+        self.start_auto_save()
+    
+    def start_style_watcher(self):
+        """Start polling the Styles folder for changed files.
+        
+        The catalog was just synced by StyleManager, so the first check
+        waits one interval.
+        """
+        self.root.after(self.config.style_watch_interval, self._style_watcher_tick)
+    
+    def _style_watcher_tick(self):
+        """Check the Styles folder and schedule the next check."""
+        self.check_style_changes()
+        self.start_style_watcher()
+    
+    def check_style_changes(self):
+        """Reload only the style categories whose files changed on disk."""
+        try:
+            added, changed, removed = self.style_manager.refresh_catalog()
+            if not (added or changed or removed):
+                return
+            
+            self.category_combo['values'] = self.style_manager.get_categories()
+            
+            category = self.category_combo.get()
+            if category in changed:
+                self.style_listbox.set_items(self.style_manager.get_styles_for_category(category))
+            elif category in removed:
+                self.category_combo.set("")
+                self.style_listbox.set_items([])
+            
+            summary = ", ".join(f"{len(names)} {label}" for names, label in
+                                [(added, "added"), (changed, "changed"), (removed, "removed")]
+                                if names)
+            self.status_bar.set_message(f"Styles updated: {summary}")
+            
+        except Exception as e:
+            self.logger.error(f"Error checking style changes: {e}")
+    
+    def start_prefetch(self):
+        """Load style categories and build the search index on a background thread."""
+        try:
+            categories = self.style_manager.get_prefetch_order(self.config.dropdown)
+            self._prefetch_state = {"done": 0, "total": len(categories) + 1}
+            self._prefetch_cancel = threading.Event()
+            self._prefetch_thread = threading.Thread(
+                target=self._run_prefetch, args=(categories,), daemon=True)
+            self._prefetch_thread.start()
+            
+            self.status_bar.set_progress(0)
+            self.status_bar.show_progress(True)
+            self.root.after(100, self._poll_prefetch)
+            
+        except Exception as e:
+            self.logger.error(f"Error starting style prefetch: {e}")
+    
+    def _run_prefetch(self, categories: List[str]):
+        """Warm the style catalog (called off the Tk thread)."""
+        state = self._prefetch_state
+        try:
+            self.style_manager.prefetch(
+                categories,
+                progress=lambda done, total: state.__setitem__("done", done),
+                cancel_event=self._prefetch_cancel,
+                random_weighting=self.config.random_weighting)
+        except Exception as e:
+            self.logger.error(f"Error prefetching styles: {e}")
+    
+    def _poll_prefetch(self):
+        """Report prefetch progress until the prefetch thread is done."""
+        state = self._prefetch_state
+        done, total = state["done"], state["total"]
+        self.status_bar.set_progress(done * 100 // total)
+        if self._prefetch_thread.is_alive():
+            self.status_bar.set_message(f"Warming style catalog {done}/{total}...", 0)
+            self.root.after(100, self._poll_prefetch)
+            return
+        
+        self.status_bar.show_progress(False)
+        self.status_bar.set_message("Style catalog ready")
     
     # Event handlers
     def on_category_change(self, event=None):
@@ -636,7 +854,14 @@ class EnhancedMATGUI:
     def on_style_select(self, style):
         """Handle style selection."""
         self.current_style.set(style)
-        self.style_manager.increment_usage(style)
+        # Completions and searches can pick styles from other categories, and the
+        # combo may show a view such as Favorites; credit a category that lists
+        # the style, or none while the style index is still being built
+        categories = self.style_manager.get_categories_for_style(style, wait=False)
+        category = self.category_combo.get()
+        if category not in categories:
+            category = categories[0] if categories else None
+        self.style_manager.increment_usage(style, category)
         
         # Update favorite button
         if self.style_manager.is_favorite(style):
@@ -764,7 +989,7 @@ class EnhancedMATGUI:
             self.preview_text.config(state="disabled")
             
             # Validate and show issues
-            issues = self.prompt_manager.validate_prompt(prompt)
+            issues = PromptManager.validate_prompt(prompt)
             if issues:
                 self.validation_label.config(text=f"⚠ {len(issues)} issues found", fg="orange")
                 self.tooltip_manager.add_tooltip(self.validation_label, "\\n".join(issues))
@@ -775,33 +1000,39 @@ class EnhancedMATGUI:
             self.logger.error(f"Error updating preview: {e}")
     
     def select_random(self):
-        """Select random style."""
+        """Select a random style from the whole catalog."""
         try:
-            categories = self.style_manager.get_categories()
-            if not categories:
+            choice = self.style_manager.get_random_style(self.config.random_weighting,
+                                                         self.config.random_no_repeat)
+            if not choice:
+                self.status_bar.set_message("Random styles are not ready yet")
                 return
             
-            # Select random category
-            random_category = random.choice(categories)
-            self.category_combo.set(random_category)
-            self.on_category_change()
+            random_style, random_category, position = choice
+            self.current_style.set(random_style)
             
-            # Select random style from category
-            styles = self.style_manager.get_styles_for_category(random_category)
-            if styles:
-                random_style = random.choice(styles)
-                self.current_style.set(random_style)
-                # Update the listbox selection
-                self.style_listbox.listbox.selection_clear(0, tk.END)
+            # Only repopulate the listbox when the style is not already listed
+            if self.category_combo.get() != random_category:
+                self.style_listbox.search_var.set("")
+                self.category_combo.set(random_category)
+                self.on_category_change()
+            
+            if self.style_listbox.search_var.get():
                 try:
                     index = self.style_listbox.filtered_items.index(random_style)
-                    self.style_listbox.listbox.selection_set(index)
-                    self.style_listbox.listbox.see(index)
                 except ValueError:
-                    pass
-                
-                self.on_style_select(random_style)
-                self.status_bar.set_message(f"Random style selected: {random_style}")
+                    index = None
+            else:
+                index = position
+            
+            # Update the listbox selection
+            self.style_listbox.listbox.selection_clear(0, tk.END)
+            if index is not None:
+                self.style_listbox.listbox.selection_set(index)
+                self.style_listbox.listbox.see(index)
+            
+            self.on_style_select(random_style)
+            self.status_bar.set_message(f"Random style selected: {random_style}")
                 
         except Exception as e:
             self.logger.error(f"Error selecting random style: {e}")
@@ -825,7 +1056,8 @@ class EnhancedMATGUI:
             }
             
             self.prompt_manager.add_to_history(prompt, current_style, parameters)
-            self.refresh_history_list()
+            if self.is_tab_built("history"):
+                self.refresh_history_list()
             
             self.status_bar.set_message("Prompt copied to clipboard!")
             
@@ -863,7 +1095,7 @@ class EnhancedMATGUI:
         """Validate current prompt and show detailed results."""
         try:
             prompt = self.build_prompt()
-            issues = self.prompt_manager.validate_prompt(prompt)
+            issues = PromptManager.validate_prompt(prompt)
             
             if issues:
                 message = "Prompt Issues Found:\\n\\n" + "\\n".join(f"• {issue}" for issue in issues)
@@ -884,8 +1116,9 @@ class EnhancedMATGUI:
                 return
             
             # Switch to templates tab and populate fields
+            self.ensure_tab("templates")
             self.tab_manager.select_tab("templates")
-            self.template_name_var.set(f"Template {len(self.prompt_manager.get_templates()) + 1}")
+            self.template_name_var.set(f"Template {self.prompt_manager.count_templates() + 1}")
             self.template_content_text.delete("1.0", tk.END)
             self.template_content_text.insert(tk.END, prompt)
             
@@ -983,43 +1216,183 @@ class EnhancedMATGUI:
         """Show only favorite styles."""
         try:
             favorites = self.style_manager.get_favorites()
-            self.style_listbox.set_items(favorites)
+            self.style_listbox.set_items(favorites, formatter=self.format_style_with_categories)
             self.category_combo.set("Favorites")
             self.status_bar.set_message(f"Showing {len(favorites)} favorite styles")
             
         except Exception as e:
             self.logger.error(f"Error showing favorites: {e}")
     
-    def search_history(self):
-        """Search prompt history."""
+    def show_similar_styles(self):
+        """Show the styles most similar to the current style on the background search worker."""
+        style = self.current_style.get()
+        if not style:
+            messagebox.showwarning("More Like This", "Please select a style first")
+            return
+        if not SIMILARITY_AVAILABLE:
+            messagebox.showinfo("More Like This", "Install numpy to enable style similarity")
+            return
+        self.style_search_worker.submit(self.style_manager.get_similar_styles,
+                                        lambda results: self._show_similar_styles(style, results), style)
+    
+    def _show_similar_styles(self, style: str, results: List[str]):
+        """Show similar styles with category badges."""
         try:
-            search_term = self.history_search_var.get()
-            if search_term.strip():
-                results = self.prompt_manager.search_history(search_term)
-            else:
-                results = self.prompt_manager.get_history()
+            self.style_listbox.search_var.set("")
+            self.style_listbox.set_items(results, formatter=self.format_style_with_categories)
+            self.category_combo.set("Similar Styles")
+            self.status_bar.set_message(f"Showing {len(results)} styles similar to '{style}'")
+            
+        except Exception as e:
+            self.logger.error(f"Error showing similar styles: {e}")
+    
+    def filter_by_tags(self):
+        """Filter the whole catalog by a tag expression on the background search worker."""
+        expression = self.tag_filter_var.get()
+        if not expression.strip():
+            return
+        self.style_search_worker.submit(self._query_tags,
+                                        lambda outcome: self._show_tag_filter_results(expression, *outcome),
+                                        expression)
+    
+    def _query_tags(self, expression: str):
+        """Evaluate a tag expression (called off the Tk thread); returns (results, error)."""
+        try:
+            return self.style_manager.filter_styles(expression), None
+        except ValueError as e:
+            return [], str(e)
+    
+    def _show_tag_filter_results(self, expression: str, results: List[str], error: Optional[str]):
+        """Show styles matching a tag filter with category badges."""
+        if error:
+            messagebox.showerror("Filter by Tags", f"Invalid tag filter: {error}")
+            return
+        
+        try:
+            self.style_listbox.search_var.set("")
+            self.style_listbox.set_items(results, formatter=self.format_style_with_categories)
+            self.category_combo.set("Tag Filter")
+            self.status_bar.set_message(f"Found {len(results)} styles matching '{expression}'")
+            
+        except Exception as e:
+            self.logger.error(f"Error showing tag filter results: {e}")
+    
+    def edit_style_tags(self):
+        """Edit the current style's tags in its category's tag file."""
+        try:
+            style = self.current_style.get()
+            if not style:
+                messagebox.showwarning("Edit Tags", "Please select a style first")
+                return
             
-            self.history_listbox.delete(0, tk.END)
-            for item in results:
-                timestamp = item.timestamp[:19].replace('T', ' ')  # Format timestamp
-                display_text = f"[{timestamp}] {item.prompt[:80]}..."
-                self.history_listbox.insert(tk.END, display_text)
+            categories = self.style_manager.get_categories_for_style(style)
+            if not categories:
+                return
+            category = self.category_combo.get()
+            if category not in categories:
+                category = categories[0]
+            
+            tags = simpledialog.askstring(
+                "Edit Tags", f"Tags for '{style}' in {category} (comma separated):",
+                initialvalue=", ".join(self.style_manager.get_tags(style, category)),
+                parent=self.root
+            )
+            if tags is None:
+                return
             
+            self.style_manager.set_tags(style, category, tags.split(","))
+            self.status_bar.set_message(f"Tags updated for '{style}'")
+            
+        except Exception as e:
+            self.logger.error(f"Error editing tags: {e}")
+            messagebox.showerror("Error", f"Failed to edit tags: {e}")
+    
+    def search_all_styles(self):
+        """Search every category on the background search worker."""
+        search_term = self.catalog_search_var.get()
+        if not search_term.strip():
+            return
+        self.style_search_worker.submit(self.style_manager.search_styles,
+                                        self._show_style_search_results, search_term)
+    
+    def _show_style_search_results(self, results: List[str]):
+        """Show catalog-wide search results with category badges."""
+        try:
+            self.style_listbox.search_var.set("")
+            self.style_listbox.set_items(results, formatter=self.format_style_with_categories)
+            self.category_combo.set("Search Results")
+            self.status_bar.set_message(f"Found {len(results)} styles across all categories")
+            
+        except Exception as e:
+            self.logger.error(f"Error showing style search results: {e}")
+    
+    def format_style_with_categories(self, style: str) -> str:
+        """Format a style with badges for the categories that list it.
+        
+        Styles have no badges until the style index is ready.
+        """
+        categories = self.style_manager.get_categories_for_style(style, wait=False)
+        if not categories:
+            return style
+        badges = ", ".join(categories[:3])
+        if len(categories) > 3:
+            badges += f" +{len(categories) - 3}"
+        return f"{style}  [{badges}]"
+    
+    def search_history(self):
+        """Search prompt history on the background search worker."""
+        search_term = self.history_search_var.get()
+        self.history_search_worker.submit(self._query_history, self._show_history_results,
+                                          search_term)
+    
+    def _query_history(self, search_term: str) -> PagedSequence:
+        """Count a history query's matches (called off the Tk thread).
+        
+        The rows themselves are fetched page by page as they are shown.
+        """
+        prompt_manager = self.prompt_manager
+        count = prompt_manager.count_history(search_term)
+        return PagedSequence(count, lambda offset, limit:
+                             prompt_manager.search_history(search_term, limit, offset))
+    
+    def _show_history_results(self, results: PagedSequence):
+        """Show history search results in the history list."""
+        try:
+            self.history_listbox.set_items(results)
             self.status_bar.set_message(f"Found {len(results)} history items")
             
         except Exception as e:
             self.logger.error(f"Error searching history: {e}")
     
+    def format_history_item(self, item: PromptHistoryItem) -> str:
+        """Format a history item as a list row."""
+        timestamp = item.last_used[:19].replace('T', ' ')  # Format timestamp
+        hits = f" (x{item.hit_count})" if item.hit_count > 1 else ""
+        return f"[{timestamp}]{hits} {item.prompt[:80]}..."
+    
+    def show_most_reused(self):
+        """Show the most often copied prompts in the history list."""
+        try:
+            self.history_search_worker.cancel()
+            items = self.prompt_manager.get_most_reused()
+            self.history_listbox.set_items(items)
+            self.status_bar.set_message(f"Showing the {len(items)} most reused prompts")
+            
+        except Exception as e:
+            self.logger.error(f"Error showing most reused prompts: {e}")
+    
+    def get_selected_history_item(self) -> Optional[PromptHistoryItem]:
+        """Get the history item selected in the list, which may be a search result."""
+        selection = self.history_listbox.curselection()
+        if not selection:
+            return None
+        return self.history_listbox.items[selection[0]]
+    
     def load_from_history(self, event=None):
         """Load selected history item to editor."""
         try:
-            selection = self.history_listbox.curselection()
-            if not selection:
-                return
-            
-            history_items = self.prompt_manager.get_history()
-            if selection[0] < len(history_items):
-                item = history_items[selection[0]]
+            item = self.get_selected_history_item()
+            if item:
                 self.prompt_text.delete("1.0", tk.END)
                 self.prompt_text.insert(tk.END, item.prompt)
                 self.tab_manager.select_tab("prompt")
@@ -1032,13 +1405,8 @@ class EnhancedMATGUI:
     def copy_from_history(self):
         """Copy selected history item to clipboard."""
         try:
-            selection = self.history_listbox.curselection()
-            if not selection:
-                return
-            
-            history_items = self.prompt_manager.get_history()
-            if selection[0] < len(history_items):
-                item = history_items[selection[0]]
+            item = self.get_selected_history_item()
+            if item:
                 self.root.clipboard_clear()
                 self.root.clipboard_append(item.prompt)
                 self.root.update()
@@ -1081,9 +1449,72 @@ class EnhancedMATGUI:
             messagebox.showerror("Error", f"Failed to export history: {e}")
     
     def import_styles(self):
-        """Import styles from file."""
-        # This would be implemented based on specific requirements
-        messagebox.showinfo("Feature", "Style import feature coming soon!")
+        """Import styles from a text, CSV or JSON file on a background thread."""
+        try:
+            if getattr(self, "_import_thread", None) and self._import_thread.is_alive():
+                messagebox.showinfo("Import Styles", "An import is already running")
+                return
+            
+            file_path = filedialog.askopenfilename(
+                title="Import Styles",
+                filetypes=[("Style lists", "*.txt *.csv *.json *.jsonl"), ("All files", "*.*")]
+            )
+            if not file_path:
+                return
+            
+            default_category = simpledialog.askstring(
+                "Import Styles", "Category for styles without one:",
+                initialvalue=os.path.splitext(os.path.basename(file_path))[0],
+                parent=self.root
+            )
+            if default_category is None:
+                return
+            
+            self._import_state = {"progress": 0, "result": None, "error": None}
+            self._import_thread = threading.Thread(
+                target=self._run_import, args=(file_path, default_category), daemon=True)
+            self._import_thread.start()
+            
+            self.status_bar.set_progress(0)
+            self.status_bar.show_progress(True)
+            self.status_bar.set_message(f"Importing styles from {os.path.basename(file_path)}...", 0)
+            self.root.after(100, self._poll_import)
+            
+        except Exception as e:
+            self.logger.error(f"Error starting style import: {e}")
+            messagebox.showerror("Error", f"Failed to import styles: {e}")
+    
+    def _run_import(self, file_path: str, default_category: str):
+        """Run a style import (called off the Tk thread)."""
+        state = self._import_state
+        try:
+            importer = StyleImporter(self.style_manager)
+            state["result"] = importer.import_file(
+                file_path, default_category,
+                progress=lambda percent: state.__setitem__("progress", percent))
+        except Exception as e:
+            state["error"] = e
+    
+    def _poll_import(self):
+        """Report import progress and finish up once the import thread is done."""
+        state = self._import_state
+        self.status_bar.set_progress(state["progress"])
+        if self._import_thread.is_alive():
+            self.root.after(100, self._poll_import)
+            return
+        
+        self.status_bar.show_progress(False)
+        if state["error"]:
+            self.logger.error(f"Error importing styles: {state['error']}")
+            self.status_bar.set_message("Style import failed")
+            messagebox.showerror("Error", f"Failed to import styles: {state['error']}")
+            return
+        
+        result = state["result"]
+        self.check_style_changes()
+        self.status_bar.set_message(
+            f"Imported {result.total_added} styles into {len(result.added)} categories "
+            f"({result.duplicates} duplicates, {result.invalid} invalid skipped)")
     
     def save_settings(self):
         """Save current settings."""
@@ -1095,8 +1526,14 @@ class EnhancedMATGUI:
             self.config.radioStylize = self.radio_stylize.get()
             self.config.radioChaos = self.radio_chaos.get()
             self.config.check_vars = {str(k): v.get() for k, v in self.check_vars.items()}
-            self.config.theme = self.theme_var.get()
-            self.config.auto_save_interval = self.autosave_var.get() * 1000
+            if self.is_tab_built("settings"):
+                self.config.theme = self.theme_var.get()
+                self.config.auto_save_interval = self.autosave_var.get() * 1000
+                self.config.max_history = max(0, self.max_history_var.get())
+                if self._prompt_manager is not None:
+                    self._prompt_manager.set_max_history(self.config.max_history)
+                    if self.is_tab_built("history"):
+                        self.refresh_history_list()
             
             # Save window position and size
             geometry = self.root.geometry()
@@ -1125,6 +1562,7 @@ class EnhancedMATGUI:
                 self.config = ConfigData()  # Create new default config
                 self.theme_var.set(self.config.theme)
                 self.autosave_var.set(self.config.auto_save_interval // 1000)
+                self.max_history_var.set(self.config.max_history)
                 self.status_bar.set_message("Settings reset to defaults")
                 
         except Exception as e:
@@ -1171,16 +1609,19 @@ class EnhancedMATGUI:
             self.logger.error(f"Error refreshing templates: {e}")
     
     def refresh_history_list(self):
-        """Refresh history list."""
+        """Refresh history list, keeping the current search."""
         try:
-            history_items = self.prompt_manager.get_history(50)  # Last 50 items
-            self.history_listbox.delete(0, tk.END)
+            search_term = self.history_search_var.get()
+            if search_term.strip():
+                self.search_history()
+                return
+            
+            self.history_search_worker.cancel()
+            prompt_manager = self.prompt_manager
+            self.history_listbox.set_items(PagedSequence(
+                prompt_manager.count_history(),
+                lambda offset, limit: prompt_manager.get_history(limit, offset)))
             
-            for item in history_items:
-                timestamp = item.timestamp[:19].replace('T', ' ')  # Format timestamp
-                display_text = f"[{timestamp}] {item.prompt[:80]}..."
-                self.history_listbox.insert(tk.END, display_text)
-                
         except Exception as e:
             self.logger.error(f"Error refreshing history: {e}")
     
@@ -1189,12 +1630,14 @@ class EnhancedMATGUI:
         try:
             # Auto-save current prompt
             autosave_path = os.path.join(self.base_path, "autosave_prompt.txt")
-            with open(autosave_path, 'w', encoding='utf-8') as file:
-                file.write(self.build_prompt())
+            atomic_write(autosave_path, self.build_prompt())
             
             # Auto-save configuration
             self.save_settings()
             
+            # Flush batched favorites and usage stats
+            self.style_manager.flush_metadata()
+            
         except Exception as e:
             self.logger.error(f"Error in auto-save: {e}")
     
@@ -1202,6 +1645,13 @@ class EnhancedMATGUI:
         """Handle application exit."""
         try:
             self.auto_save()
+            if getattr(self, "_prefetch_cancel", None):
+                self._prefetch_cancel.set()
+            self.style_search_worker.shutdown()
+            self.history_search_worker.shutdown()
+            if self._prompt_manager is not None:
+                self._prompt_manager.close()  # waits for queued template and history writes
+            sync_pending()  # fsync whatever the last group has not covered yet
             self.logger.info("Application exiting")
             self.root.destroy()
             
@@ -1212,8 +1662,13 @@ class EnhancedMATGUI:
 def main():
     """Main application entry point."""
     try:
+        parser = argparse.ArgumentParser(description="Enhanced Midjourney Assistant Tool")
+        parser.add_argument("--startup-profile", action="store_true",
+                            help="log how long each startup phase takes")
+        args = parser.parse_args()
+        
         root = tk.Tk()
-        app = EnhancedMATGUI(root)
+        app = EnhancedMATGUI(root, startup_profile=args.startup_profile)
         root.mainloop()
     except Exception as e:
         print(f"Fatal error: {e}")
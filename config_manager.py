@@ -1,10 +1,11 @@
 """Configuration management module for MAT."""
 import json
-import os
 import logging
 from typing import Dict, Any, Optional
 from dataclasses import dataclass, asdict
 
+from persistence import atomic_write, load_with_backup
+
 @dataclass
 class ConfigData:
     """Data class for configuration settings."""
@@ -20,6 +21,13 @@ class ConfigData:
     window_height: int = 600
     theme: str = "dark"
     auto_save_interval: int = 10000
+    style_watch_interval: int = 3000
+    style_cache_max_entries: int = 0  # 0 = unbounded
+    style_cache_max_bytes: int = 0  # 0 = unbounded
+    random_weighting: str = "size"  # "size", "usage" or "favorites"
+    random_no_repeat: int = 20
+    max_history: int = 0  # prompts kept in history; 0 = all
+    storage_backend: str = "json"  # "json" or "sqlite" for templates and history
     
     def __post_init__(self):
         if self.check_vars is None:
@@ -37,30 +45,27 @@ class ConfigManager:
         """Save configuration to file with error handling."""
         try:
             config_dict = asdict(config_data)
-            with open(self.config_path, 'w', encoding='utf-8') as file:
-                json.dump(config_dict, file, indent=4)
+            atomic_write(self.config_path, json.dumps(config_dict, indent=4))
             self.logger.info("Configuration saved successfully")
             return True
-        except (IOError, json.JSONEncodeError) as e:
+        except (IOError, OSError, TypeError, ValueError) as e:
             self.logger.error(f"Failed to save configuration: {e}")
             return False
     
     def load_config(self) -> ConfigData:
-        """Load configuration from file with fallback to defaults."""
-        if not os.path.exists(self.config_path):
+        """Load configuration from file (or its last good copy) with fallback to defaults."""
+        config_dict = load_with_backup(self.config_path, json.loads)
+        if config_dict is None:
             self.logger.info("Config file not found, using defaults")
             return self._default_config
         
         try:
-            with open(self.config_path, 'r', encoding='utf-8') as file:
-                config_dict = json.load(file)
-            
             # Validate and merge with defaults
             validated_config = self._validate_config(config_dict)
             self.logger.info("Configuration loaded successfully")
             return ConfigData(**validated_config)
             
-        except (IOError, json.JSONDecodeError, TypeError) as e:
+        except (AttributeError, TypeError, ValueError) as e:
             self.logger.error(f"Failed to load configuration: {e}")
             return self._default_config
     
@@ -79,5 +84,10 @@ class ConfigManager:
         config_dict["radioMode"] = max(0, min(2, config_dict.get("radioMode", 0)))
         config_dict["radioStylize"] = max(0, min(5, config_dict.get("radioStylize", 0)))
         config_dict["radioChaos"] = max(0, min(4, config_dict.get("radioChaos", 0)))
+        if config_dict["random_weighting"] not in ("size", "usage", "favorites"):
+            config_dict["random_weighting"] = default_dict["random_weighting"]
+        config_dict["max_history"] = max(0, int(config_dict.get("max_history", 0) or 0))
+        if config_dict["storage_backend"] not in ("json", "sqlite"):
+            config_dict["storage_backend"] = default_dict["storage_backend"]
         
         return config_dict
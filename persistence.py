@@ -0,0 +1,272 @@
+"""Crash-safe and background file writing for MAT."""
+import os
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple, TypeVar
+
+DEFAULT_MAX_PENDING = 1024  # queued writes before submitters block
+DEFAULT_FSYNC_INTERVAL = 2.0  # seconds between grouped fsyncs
+BACKUP_SUFFIX = ".bak"
+
+T = TypeVar("T")
+
+class FsyncBatcher:
+    """Makes recently written files durable with one grouped fsync per interval.
+    
+    Writers mark files instead of paying an fsync per write; a timer then
+    fsyncs every marked file, and their directories so renames stick.
+    """
+    
+    def __init__(self, interval: float = DEFAULT_FSYNC_INTERVAL):
+        self.interval = interval
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._dirty: Dict[str, int] = {}  # path -> write number, to spot rewrites mid-sync
+        self._writes = 0
+        self._timer: Optional[threading.Timer] = None
+    
+    def mark_dirty(self, path: str) -> None:
+        """Schedule path to be fsynced with the next group."""
+        with self._lock:
+            self._writes += 1
+            self._dirty[path] = self._writes
+            self._schedule()
+    
+    def is_dirty(self, path: str) -> bool:
+        """Whether path has been written since it was last fsynced."""
+        with self._lock:
+            return path in self._dirty
+    
+    def sync(self) -> None:
+        """Fsync every marked file now."""
+        with self._lock:
+            pending = dict(self._dirty)
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        
+        synced = {}
+        directories = set()
+        for path, write in pending.items():
+            try:
+                # Windows only fsyncs handles opened for writing
+                fd = os.open(path, os.O_RDWR)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+                directories.add(os.path.dirname(os.path.abspath(path)))
+            except FileNotFoundError:
+                pass  # nothing left to make durable
+            except OSError as e:
+                self.logger.error(f"Error syncing {path}: {e}")
+                continue  # stays dirty, so the next group retries it
+            synced[path] = write
+        for directory in directories:
+            _fsync_directory(directory)
+        
+        with self._lock:
+            for path, write in synced.items():
+                if self._dirty.get(path) == write:
+                    del self._dirty[path]
+            if self._dirty:
+                self._schedule()
+    
+    def _schedule(self) -> None:
+        """Start the group timer unless one is running; call with the lock held."""
+        if self._timer is None:
+            self._timer = threading.Timer(self.interval, self.sync)
+            self._timer.daemon = True
+            self._timer.start()
+
+def _fsync_directory(directory: str) -> None:
+    """Make renames in directory durable where the platform allows it."""
+    if os.name == 'nt':
+        return  # directories cannot be opened for fsync on Windows
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+_fsync_batcher = FsyncBatcher()
+
+def sync_later(path: str) -> None:
+    """Have path fsynced with the next group, e.g. after appending to it."""
+    _fsync_batcher.mark_dirty(path)
+
+def sync_pending() -> None:
+    """Fsync every file written since the last group; call before exiting."""
+    _fsync_batcher.sync()
+
+def atomic_write(path: str, text: str) -> None:
+    """Replace path with text so a crash never leaves it half-written.
+    
+    The text goes to a temporary file that is renamed over path; the fsync
+    is left to the next group. Once the previous contents are known to be
+    on disk they are kept as path.bak, the last good copy that
+    load_with_backup() falls back to.
+    """
+    temp_path = path + ".tmp"
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        file.write(text)
+    if os.path.exists(path) and not _fsync_batcher.is_dirty(path):
+        os.replace(path, path + BACKUP_SUFFIX)
+    os.replace(temp_path, path)
+    _fsync_batcher.mark_dirty(path)
+
+def load_with_backup(path: str, parse: Callable[[str], T]) -> Optional[T]:
+    """Parse path, falling back to its last good copy if it is missing or corrupt.
+    
+    parse gets the file's text and raises ValueError or TypeError if it is
+    invalid. An empty path is also treated as corrupt when a backup exists,
+    since a crash before the grouped fsync can leave a renamed file empty.
+    A recovered copy is also restored to path, so later appends and
+    backups build on good data. Returns None when neither file can be used.
+    """
+    logger = logging.getLogger(__name__)
+    backup_path = path + BACKUP_SUFFIX
+    for candidate in (path, backup_path):
+        if not os.path.exists(candidate):
+            continue
+        try:
+            with open(candidate, 'r', encoding='utf-8') as file:
+                text = file.read()
+            if not text and candidate == path and os.path.exists(backup_path):
+                raise ValueError("file is empty")
+            result = parse(text)
+        except (IOError, UnicodeDecodeError, ValueError, TypeError) as e:
+            logger.error(f"Error loading {candidate}: {e}")
+            continue
+        
+        if candidate != path:
+            logger.warning(f"Recovered {path} from its last good copy")
+            try:
+                temp_path = path + ".tmp"
+                with open(temp_path, 'w', encoding='utf-8') as file:
+                    file.write(text)
+                os.replace(temp_path, path)
+                _fsync_batcher.mark_dirty(path)
+            except OSError as e:
+                logger.error(f"Error restoring {path}: {e}")
+        return result
+    return None
+
+class PersistenceWorker:
+    """Writes files on a dedicated thread so disk latency stays off the Tk thread.
+    
+    Writes are queued per file and applied in submission order. Queued
+    appends to a file are coalesced into one write, and a replace drops
+    everything still queued for its file, since the new contents supersede
+    it. At most max_pending writes are queued; beyond that submitters block
+    until the thread catches up.
+    """
+    
+    def __init__(self, max_pending: int = DEFAULT_MAX_PENDING, name: str = "mat-persistence"):
+        self.max_pending = max_pending
+        self.name = name
+        self.logger = logging.getLogger(__name__)
+        self._condition = threading.Condition()
+        # File path -> queued ("append", text) / ("replace", render) operations
+        self._pending: "OrderedDict[str, List[Tuple[str, object]]]" = OrderedDict()
+        self._pending_count = 0
+        self._busy = False
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+    
+    def append(self, path: str, text: str) -> None:
+        """Queue text to be appended to path."""
+        self._submit(path, ("append", text))
+    
+    def replace(self, path: str, render: Callable[[], str]) -> None:
+        """Queue path to be rewritten with the text render() returns.
+        
+        render is called on the worker thread, so it must only read a
+        snapshot of the data it serializes.
+        """
+        self._submit(path, ("replace", render))
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued write is on disk; False if timeout ran out first."""
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._pending and not self._busy, timeout)
+    
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Flush queued writes and stop the thread; later writes happen synchronously."""
+        self.flush(timeout)
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+    
+    def _submit(self, path: str, operation: Tuple[str, object]) -> None:
+        with self._condition:
+            if not self._closed:
+                self._condition.wait_for(lambda: self._pending_count < self.max_pending
+                                         or self._closed)
+            if self._closed:
+                self._write(path, [operation])
+                return
+            
+            operations = self._pending.setdefault(path, [])
+            if operation[0] == "replace":
+                self._pending_count -= len(operations)
+                operations.clear()
+            operations.append(operation)
+            self._pending_count += 1
+            
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+    
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending or self._closed)
+                if not self._pending:
+                    return
+                path, operations = self._pending.popitem(last=False)
+                self._pending_count -= len(operations)
+                self._busy = True
+                self._condition.notify_all()
+            
+            self._write(path, operations)
+            
+            with self._condition:
+                self._busy = False
+                self._condition.notify_all()
+    
+    def _write(self, path: str, operations: List[Tuple[str, object]]) -> None:
+        """Apply one file's queued operations, joining runs of appends."""
+        appends: List[str] = []
+        try:
+            for kind, payload in operations:
+                if kind == "append":
+                    appends.append(payload)
+                    continue
+                
+                if appends:
+                    self._append_text(path, "".join(appends))
+                    appends = []
+                self._replace_text(path, payload())
+            
+            if appends:
+                self._append_text(path, "".join(appends))
+        except Exception as e:
+            self.logger.error(f"Error writing {path}: {e}")
+    
+    @staticmethod
+    def _append_text(path: str, text: str) -> None:
+        with open(path, 'a', encoding='utf-8') as file:
+            file.write(text)
+        sync_later(path)
+    
+    @staticmethod
+    def _replace_text(path: str, text: str) -> None:
+        atomic_write(path, text)
@@ -0,0 +1,315 @@
+"""SQLite storage for prompt templates and history in MAT."""
+import json
+import sqlite3
+import logging
+import threading
+from typing import List, Optional
+
+from prompt_manager import PromptTemplate, PromptHistoryItem, prompt_hash
+
+DATABASE_FILENAME = "prompts.db"
+SCHEMA_VERSION = 2  # 2 added prompt deduplication to history
+FTS_MIN_TERM_LENGTH = 3  # the trigram tokenizer cannot match shorter terms
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS templates (
+    name TEXT PRIMARY KEY,
+    template TEXT NOT NULL,
+    description TEXT NOT NULL DEFAULT '',
+    tags TEXT NOT NULL DEFAULT '[]',
+    created_at TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    prompt TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    style_used TEXT NOT NULL DEFAULT '',
+    parameters TEXT NOT NULL DEFAULT '{}',
+    hit_count INTEGER NOT NULL DEFAULT 1,
+    last_used TEXT NOT NULL DEFAULT '',
+    content_hash TEXT NOT NULL DEFAULT ''
+);
+"""
+
+# Created after any upgrade, once every history row has a unique hash
+HISTORY_INDEXES = """
+CREATE UNIQUE INDEX IF NOT EXISTS history_hash ON history(content_hash);
+CREATE INDEX IF NOT EXISTS history_hits ON history(hit_count);
+"""
+
+# External-content FTS5 tables kept in sync by triggers. The trigram
+# tokenizer gives case-insensitive substring matching, like the JSON store.
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+    prompt, style_used, content='history', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS history_ai AFTER INSERT ON history BEGIN
+    INSERT INTO history_fts(rowid, prompt, style_used) VALUES (new.id, new.prompt, new.style_used);
+END;
+CREATE TRIGGER IF NOT EXISTS history_ad AFTER DELETE ON history BEGIN
+    INSERT INTO history_fts(history_fts, rowid, prompt, style_used)
+    VALUES ('delete', old.id, old.prompt, old.style_used);
+END;
+CREATE VIRTUAL TABLE IF NOT EXISTS templates_fts USING fts5(
+    name, description, tags, content='templates', content_rowid='rowid', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS templates_ai AFTER INSERT ON templates BEGIN
+    INSERT INTO templates_fts(rowid, name, description, tags)
+    VALUES (new.rowid, new.name, new.description, new.tags);
+END;
+CREATE TRIGGER IF NOT EXISTS templates_ad AFTER DELETE ON templates BEGIN
+    INSERT INTO templates_fts(templates_fts, rowid, name, description, tags)
+    VALUES ('delete', old.rowid, old.name, old.description, old.tags);
+END;
+CREATE TRIGGER IF NOT EXISTS templates_au AFTER UPDATE ON templates BEGIN
+    INSERT INTO templates_fts(templates_fts, rowid, name, description, tags)
+    VALUES ('delete', old.rowid, old.name, old.description, old.tags);
+    INSERT INTO templates_fts(rowid, name, description, tags)
+    VALUES (new.rowid, new.name, new.description, new.tags);
+END;
+"""
+
+def _fts_phrase(search_term: str) -> str:
+    """Quote a search term as a single FTS5 phrase."""
+    return '"' + search_term.replace('"', '""') + '"'
+
+def _like_pattern(search_term: str) -> str:
+    """Escape a search term for a LIKE substring match."""
+    escaped = search_term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+class PromptDatabase:
+    """Templates and history in a single SQLite database in WAL mode.
+    
+    Searches use FTS5 indexes when the SQLite build supports them and fall
+    back to LIKE scans otherwise. The connection is shared between the Tk
+    thread and the background search worker, so every query holds a lock.
+    """
+    
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+        
+        try:
+            self._connection.executescript(FTS_SCHEMA)
+            self.has_fts = True
+        except sqlite3.OperationalError as e:
+            self.logger.warning(f"FTS5 unavailable, searches will scan: {e}")
+            self.has_fts = False
+        
+        if self._user_version == 1:
+            self._upgrade_history()
+        self._connection.executescript(HISTORY_INDEXES)
+    
+    @property
+    def is_new(self) -> bool:
+        """Whether the database has not been initialized with data yet."""
+        return self._user_version == 0
+    
+    @property
+    def _user_version(self) -> int:
+        return self._connection.execute("PRAGMA user_version").fetchone()[0]
+    
+    def import_data(self, templates: List[PromptTemplate], history: List[PromptHistoryItem]) -> None:
+        """Bulk-load templates and history (oldest first) and mark the database initialized."""
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO templates (name, template, description, tags, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [self._template_row(template) for template in templates])
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO history (prompt, timestamp, style_used, parameters, "
+                "hit_count, last_used, content_hash) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [self._history_row(item) for item in history])
+            self._connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    
+    def close(self) -> None:
+        """Close the connection."""
+        with self._lock:
+            self._connection.close()
+    
+    # Templates
+    def save_template(self, template: PromptTemplate) -> None:
+        """Insert or replace a template by name."""
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT INTO templates (name, template, description, tags, created_at) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT(name) DO UPDATE SET "
+                "template = excluded.template, description = excluded.description, "
+                "tags = excluded.tags, created_at = excluded.created_at",
+                self._template_row(template))
+    
+    def delete_template(self, name: str) -> None:
+        """Delete a template by name."""
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM templates WHERE name = ?", (name,))
+    
+    def get_templates(self) -> List[PromptTemplate]:
+        """Get all templates in the order they were first saved."""
+        return self._query_templates("SELECT * FROM templates ORDER BY rowid")
+    
+    def get_template(self, name: str) -> Optional[PromptTemplate]:
+        """Get a template by name."""
+        templates = self._query_templates("SELECT * FROM templates WHERE name = ?", (name,))
+        return templates[0] if templates else None
+    
+    def count_templates(self) -> int:
+        """Number of stored templates."""
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM templates").fetchone()[0]
+    
+    def get_templates_by_tag(self, tag: str) -> List[PromptTemplate]:
+        """Templates carrying tag (case-insensitive)."""
+        return self._query_templates(
+            "SELECT * FROM templates WHERE EXISTS (SELECT 1 FROM json_each(templates.tags) "
+            "WHERE lower(json_each.value) = lower(?)) ORDER BY rowid", (tag,))
+    
+    def search_templates(self, search_term: str) -> List[PromptTemplate]:
+        """Templates whose name, description or tags contain search_term."""
+        if self.has_fts and len(search_term) >= FTS_MIN_TERM_LENGTH:
+            return self._query_templates(
+                "SELECT templates.* FROM templates_fts JOIN templates "
+                "ON templates.rowid = templates_fts.rowid "
+                "WHERE templates_fts MATCH ? ORDER BY templates.rowid",
+                (_fts_phrase(search_term),))
+        pattern = _like_pattern(search_term)
+        return self._query_templates(
+            "SELECT * FROM templates WHERE name LIKE ?1 ESCAPE '\\' "
+            "OR description LIKE ?1 ESCAPE '\\' OR tags LIKE ?1 ESCAPE '\\' ORDER BY rowid",
+            (pattern,))
+    
+    # History
+    def add_to_history(self, item: PromptHistoryItem, max_history: int = 0) -> None:
+        """Append a history item, dropping the oldest beyond max_history (0 keeps all).
+        
+        A repeated prompt replaces its earlier row, keeping the first timestamp
+        and adding to its hit count, so it moves to the top of the history.
+        """
+        row = self._history_row(item)
+        with self._lock, self._connection:
+            previous = self._connection.execute(
+                "SELECT id, timestamp, hit_count FROM history WHERE content_hash = ?",
+                (row[-1],)).fetchone()
+            if previous is not None:
+                self._connection.execute("DELETE FROM history WHERE id = ?", (previous["id"],))
+                row = (row[0], previous["timestamp"], row[2], row[3],
+                       previous["hit_count"] + item.hit_count, row[5], row[6])
+            self._connection.execute(
+                "INSERT INTO history (prompt, timestamp, style_used, parameters, "
+                "hit_count, last_used, content_hash) VALUES (?, ?, ?, ?, ?, ?, ?)", row)
+            if max_history:
+                self._trim_history(max_history)
+    
+    def trim_history(self, max_history: int) -> None:
+        """Drop the oldest history items beyond max_history (0 keeps all)."""
+        if max_history:
+            with self._lock, self._connection:
+                self._trim_history(max_history)
+    
+    def _trim_history(self, max_history: int) -> None:
+        self._connection.execute(
+            "DELETE FROM history WHERE id <= "
+            "(SELECT id FROM history ORDER BY id DESC LIMIT 1 OFFSET ?)", (max_history,))
+    
+    def count_history(self, search_term: str = "") -> int:
+        """Number of history items matching search_term (all items if it is empty)."""
+        if not search_term:
+            sql, parameters = "SELECT COUNT(*) FROM history", ()
+        elif self.has_fts and len(search_term) >= FTS_MIN_TERM_LENGTH:
+            sql, parameters = ("SELECT COUNT(*) FROM history_fts WHERE history_fts MATCH ?",
+                               (_fts_phrase(search_term),))
+        else:
+            sql, parameters = ("SELECT COUNT(*) FROM history WHERE prompt LIKE ?1 ESCAPE '\\' "
+                               "OR style_used LIKE ?1 ESCAPE '\\'", (_like_pattern(search_term),))
+        with self._lock:
+            return self._connection.execute(sql, parameters).fetchone()[0]
+    
+    def search_history(self, search_term: str, limit: int = -1, offset: int = 0) -> List[PromptHistoryItem]:
+        """A page of the history items whose prompt or style contain search_term, newest first.
+        
+        An empty search_term matches every item; limit -1 means no limit.
+        """
+        if not search_term:
+            return self._query_history("SELECT * FROM history ORDER BY id DESC LIMIT ? OFFSET ?",
+                                       (limit, offset))
+        if self.has_fts and len(search_term) >= FTS_MIN_TERM_LENGTH:
+            return self._query_history(
+                "SELECT history.* FROM history_fts JOIN history ON history.id = history_fts.rowid "
+                "WHERE history_fts MATCH ? ORDER BY history.id DESC LIMIT ? OFFSET ?",
+                (_fts_phrase(search_term), limit, offset))
+        return self._query_history(
+            "SELECT * FROM history WHERE prompt LIKE ?1 ESCAPE '\\' "
+            "OR style_used LIKE ?1 ESCAPE '\\' ORDER BY id DESC LIMIT ?2 OFFSET ?3",
+            (_like_pattern(search_term), limit, offset))
+    
+    def get_most_reused(self, limit: int) -> List[PromptHistoryItem]:
+        """The most often copied prompts, most recently used first among ties."""
+        return self._query_history("SELECT * FROM history ORDER BY hit_count DESC, id DESC LIMIT ?",
+                                   (limit,))
+    
+    def clear_history(self) -> None:
+        """Delete every history item."""
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM history")
+    
+    def _query_templates(self, sql: str, parameters: tuple = ()) -> List[PromptTemplate]:
+        """Run a template query and convert its rows."""
+        with self._lock:
+            rows = self._connection.execute(sql, parameters).fetchall()
+        return [PromptTemplate(name=row["name"], template=row["template"],
+                               description=row["description"], tags=json.loads(row["tags"]),
+                               created_at=row["created_at"]) for row in rows]
+    
+    def _query_history(self, sql: str, parameters: tuple = ()) -> List[PromptHistoryItem]:
+        """Run a history query and convert its rows."""
+        with self._lock:
+            rows = self._connection.execute(sql, parameters).fetchall()
+        return [PromptHistoryItem(prompt=row["prompt"], timestamp=row["timestamp"],
+                                  style_used=row["style_used"],
+                                  parameters=json.loads(row["parameters"]),
+                                  hit_count=row["hit_count"], last_used=row["last_used"])
+                for row in rows]
+    
+    def _upgrade_history(self) -> None:
+        """Add the deduplication columns to a version 1 database and merge repeated prompts."""
+        with self._lock, self._connection:
+            for column in ("hit_count INTEGER NOT NULL DEFAULT 1",
+                           "last_used TEXT NOT NULL DEFAULT ''",
+                           "content_hash TEXT NOT NULL DEFAULT ''"):
+                self._connection.execute(f"ALTER TABLE history ADD COLUMN {column}")
+            
+            latest = {}  # content hash -> (id, first timestamp, hit count)
+            for row in self._connection.execute("SELECT id, prompt, timestamp FROM history ORDER BY id"):
+                content_hash = prompt_hash(row["prompt"])
+                first = latest.get(content_hash)
+                latest[content_hash] = ((row["id"], row["timestamp"], 1) if first is None else
+                                        (row["id"], first[1], first[2] + 1))
+            
+            keep = {entry[0] for entry in latest.values()}
+            stale = [(row[0],) for row in self._connection.execute("SELECT id FROM history")
+                     if row[0] not in keep]
+            self._connection.executemany("DELETE FROM history WHERE id = ?", stale)
+            self._connection.executemany(
+                "UPDATE history SET timestamp = ?, hit_count = ?, last_used = timestamp, "
+                "content_hash = ? WHERE id = ?",
+                [(first_timestamp, hit_count, content_hash, row_id)
+                 for content_hash, (row_id, first_timestamp, hit_count) in latest.items()])
+            self._connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.logger.info(f"Merged {len(stale)} repeated history items")
+    
+    @staticmethod
+    def _template_row(template: PromptTemplate) -> tuple:
+        return (template.name, template.template, template.description,
+                json.dumps(template.tags, ensure_ascii=False), template.created_at)
+    
+    @staticmethod
+    def _history_row(item: PromptHistoryItem) -> tuple:
+        return (item.prompt, item.timestamp, item.style_used,
+                json.dumps(item.parameters, ensure_ascii=False),
+                item.hit_count, item.last_used, prompt_hash(item.prompt))
@@ -1,11 +1,49 @@
 """Prompt management module for MAT."""
 import os
 import json
+import heapq
+import hashlib
 import logging
-from typing import List, Dict, Optional
+import sqlite3
+from collections import OrderedDict
+from itertools import islice
+from typing import Iterable, List, Dict, Optional, Tuple
 from dataclasses import dataclass, asdict
 from datetime import datetime
 
+from persistence import PersistenceWorker, BACKUP_SUFFIX, load_with_backup
+
+HISTORY_FILENAME = "prompt_history.jsonl"
+LEGACY_HISTORY_FILENAME = "prompt_history.json"
+DEFAULT_MAX_HISTORY = 0  # 0 keeps every prompt
+HISTORY_COMPACT_THRESHOLD = 1000  # dropped or stale log lines before the log is rewritten
+STORAGE_BACKENDS = ("json", "sqlite")
+DEFAULT_MOST_REUSED = 10
+
+def prompt_hash(prompt: str) -> str:
+    """Hash of a prompt with whitespace and case normalized, used to spot repeats."""
+    normalized = " ".join(prompt.split()).casefold()
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+def _parse_history_log(text: str) -> Tuple[List[dict], int, bool]:
+    """Parse the history log into (records, line count, whether the last line is torn).
+    
+    Unreadable lines are skipped as torn writes, but a log with no readable
+    line at all is rejected as corrupt.
+    """
+    records, line_count = [], 0
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        line_count += 1
+        try:
+            records.append(json.loads(line))
+        except json.JSONDecodeError:
+            continue  # torn write from a crash
+    if line_count and not records:
+        raise ValueError("no readable history records")
+    return records, line_count, bool(text) and not text.endswith("\n")
+
 @dataclass
 class PromptTemplate:
     """Represents a prompt template."""
@@ -28,46 +66,140 @@ class PromptHistoryItem:
     timestamp: str
     style_used: str = ""
     parameters: Dict[str, any] = None
+    hit_count: int = 1  # times this prompt was copied
+    last_used: str = ""
     
     def __post_init__(self):
         if self.parameters is None:
             self.parameters = {}
         if not self.timestamp:
             self.timestamp = datetime.now().isoformat()
+        if not self.last_used:
+            self.last_used = self.timestamp
+
+class TemplateIndex:
+    """Templates by name, with a tag index and lowercased search keys.
+    
+    Lookups by name or tag are O(1) and searches compare against keys that
+    were lowercased once, when the template was stored. Templates keep the
+    order they were first saved in.
+    """
+    
+    def __init__(self, templates: Iterable[PromptTemplate] = ()):
+        # Name -> (template, lowercased name, lowercased description)
+        self._entries: Dict[str, Tuple[PromptTemplate, str, str]] = {}
+        # Lowercased tag -> names of the templates carrying it, as an ordered set
+        self._tag_names: Dict[str, Dict[str, None]] = {}
+        for template in templates:
+            self.put(template)
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def get(self, name: str) -> Optional[PromptTemplate]:
+        """Get a template by name."""
+        entry = self._entries.get(name)
+        return entry[0] if entry else None
+    
+    def values(self) -> List[PromptTemplate]:
+        """Snapshot of every template, safe to take from another thread."""
+        return [entry[0] for entry in list(self._entries.values())]
+    
+    def put(self, template: PromptTemplate) -> bool:
+        """Add or replace a template; False if the stored one has the same content."""
+        entry = self._entries.get(template.name)
+        if entry is not None:
+            existing = entry[0]
+            if ((existing.template, existing.description, existing.tags) ==
+                    (template.template, template.description, template.tags)):
+                return False
+            self._unindex_tags(existing)
+        
+        self._entries[template.name] = (template, template.name.lower(),
+                                        template.description.lower())
+        for tag in template.tags:
+            self._tag_names.setdefault(tag.lower(), {})[template.name] = None
+        return True
+    
+    def remove(self, name: str) -> bool:
+        """Remove a template; False if there was none by that name."""
+        entry = self._entries.pop(name, None)
+        if entry is None:
+            return False
+        self._unindex_tags(entry[0])
+        return True
+    
+    def with_tag(self, tag: str) -> List[PromptTemplate]:
+        """Templates carrying tag (case-insensitive)."""
+        names = list(self._tag_names.get(tag.lower(), ()))
+        return [template for template in map(self.get, names) if template is not None]
+    
+    def search(self, search_term: str) -> List[PromptTemplate]:
+        """Templates whose name, description or tags contain search_term."""
+        search_term = search_term.lower()
+        # Distinct tags are far fewer than templates, so match them once
+        tagged = set()
+        for tag, names in list(self._tag_names.items()):
+            if search_term in tag:
+                tagged.update(names)
+        
+        return [template for name, (template, name_key, description_key)
+                in list(self._entries.items())
+                if search_term in name_key or search_term in description_key or name in tagged]
+    
+    def _unindex_tags(self, template: PromptTemplate) -> None:
+        for tag in template.tags:
+            names = self._tag_names.get(tag.lower())
+            if names is not None:
+                names.pop(template.name, None)
+                if not names:
+                    del self._tag_names[tag.lower()]
 
 class PromptManager:
-    """Manages prompt templates, history, and operations."""
+    """Manages prompt templates, history, and operations.
+    
+    With the JSON backend, files are written behind on a PersistenceWorker
+    thread; call flush() or close() to wait for them.
+    """
     
-    def __init__(self, data_folder: str):
+    def __init__(self, data_folder: str, max_history: int = DEFAULT_MAX_HISTORY,
+                 backend: str = "json"):
         self.data_folder = data_folder
+        self.max_history = max_history
         self.logger = logging.getLogger(__name__)
         self.templates_file = os.path.join(data_folder, "prompt_templates.json")
-        self.history_file = os.path.join(data_folder, "prompt_history.json")
+        self.history_file = os.path.join(data_folder, HISTORY_FILENAME)
+        self.legacy_history_file = os.path.join(data_folder, LEGACY_HISTORY_FILENAME)
         self.log_file = os.path.join(data_folder, "prompt_log.txt")
         
         # Ensure data folder exists
         os.makedirs(data_folder, exist_ok=True)
         
-        self._templates: List[PromptTemplate] = []
-        self._history: List[PromptHistoryItem] = []
-        self._load_templates()
-        self._load_history()
+        self._templates = TemplateIndex()
+        # Prompt hash -> item, least recently used first like the append-only history log
+        self._history: "OrderedDict[str, PromptHistoryItem]" = OrderedDict()
+        self._history_log_lines = 0
+        self._history_generation = 0  # bumped whenever the history list changes
+        self._last_search = None
+        self._db = None  # PromptDatabase when the sqlite backend is used
+        self._writer = PersistenceWorker(name="mat-prompt-writer")
+        if backend == "sqlite":
+            self._open_database()
+        else:
+            self._load_templates()
+            self._load_history()
     
     def save_template(self, template: PromptTemplate) -> bool:
         """Save a prompt template."""
         try:
-            # Check if template with same name exists
-            existing_index = next(
-                (i for i, t in enumerate(self._templates) if t.name == template.name),
-                None
-            )
-            
-            if existing_index is not None:
-                self._templates[existing_index] = template
-            else:
-                self._templates.append(template)
+            if self._db is not None:
+                self._db.save_template(template)
+                self.logger.info(f"Template '{template.name}' saved successfully")
+                return True
             
-            self._save_templates()
+            # Saving an unchanged template leaves the file alone
+            if self._templates.put(template):
+                self._save_templates()
             self.logger.info(f"Template '{template.name}' saved successfully")
             return True
         except Exception as e:
@@ -77,8 +209,10 @@ class PromptManager:
     def delete_template(self, name: str) -> bool:
         """Delete a prompt template."""
         try:
-            self._templates = [t for t in self._templates if t.name != name]
-            self._save_templates()
+            if self._db is not None:
+                self._db.delete_template(name)
+            elif self._templates.remove(name):
+                self._save_templates()
             self.logger.info(f"Template '{name}' deleted successfully")
             return True
         except Exception as e:
@@ -87,30 +221,42 @@ class PromptManager:
     
     def get_templates(self) -> List[PromptTemplate]:
         """Get all prompt templates."""
-        return self._templates.copy()
+        if self._db is not None:
+            return self._db.get_templates()
+        return self._templates.values()
     
     def get_template(self, name: str) -> Optional[PromptTemplate]:
         """Get a specific template by name."""
-        return next((t for t in self._templates if t.name == name), None)
+        if self._db is not None:
+            return self._db.get_template(name)
+        return self._templates.get(name)
+    
+    def count_templates(self) -> int:
+        """Get the number of templates."""
+        if self._db is not None:
+            return self._db.count_templates()
+        return len(self._templates)
+    
+    def get_templates_by_tag(self, tag: str) -> List[PromptTemplate]:
+        """Get the templates carrying a tag (case-insensitive)."""
+        if self._db is not None:
+            return self._db.get_templates_by_tag(tag)
+        return self._templates.with_tag(tag)
     
     def search_templates(self, search_term: str) -> List[PromptTemplate]:
         """Search templates by name, description, or tags."""
         if not search_term.strip():
-            return self._templates.copy()
-        
-        search_term = search_term.lower()
-        results = []
-        
-        for template in self._templates:
-            if (search_term in template.name.lower() or
-                search_term in template.description.lower() or
-                any(search_term in tag.lower() for tag in template.tags)):
-                results.append(template)
-        
-        return results
+            return self.get_templates()
+        if self._db is not None:
+            return self._db.search_templates(search_term)
+        return self._templates.search(search_term)
     
     def add_to_history(self, prompt: str, style_used: str = "", parameters: Dict = None) -> None:
-        """Add a prompt to history."""
+        """Add a prompt to history.
+        
+        A prompt already in history (ignoring whitespace and case) is not
+        added again; its entry is updated, counted and moved to the top.
+        """
         if parameters is None:
             parameters = {}
         
@@ -121,33 +267,106 @@ class PromptManager:
             parameters=parameters
         )
         
-        # Add to beginning and limit size
-        self._history.insert(0, history_item)
-        if len(self._history) > 100:  # Keep last 100 items
-            self._history = self._history[:100]
-        
-        self._save_history()
         self._append_to_log(prompt)
+        if self._db is not None:
+            try:
+                self._db.add_to_history(history_item, self.max_history)
+            except sqlite3.Error as e:
+                self.logger.error(f"Error adding to history: {e}")
+            return
+        
+        content_hash = prompt_hash(prompt)
+        existing = self._history.pop(content_hash, None)
+        if existing is not None:
+            history_item.timestamp = existing.timestamp
+            history_item.hit_count = existing.hit_count + 1
+        self._history[content_hash] = history_item
+        self._history_generation += 1
+        self._append_history(history_item)
+        
+        # Retention applies at once; the log is only rewritten once enough lines are stale
+        self._trim_history()
+        if self._history_log_lines - len(self._history) >= HISTORY_COMPACT_THRESHOLD:
+            self._save_history()
     
-    def get_history(self, limit: int = 50) -> List[PromptHistoryItem]:
-        """Get prompt history."""
-        return self._history[:limit]
+    def set_max_history(self, max_history: int) -> None:
+        """Change how many prompts history keeps (0 keeps all), dropping the excess now."""
+        self.max_history = max_history
+        if self._db is not None:
+            try:
+                self._db.trim_history(max_history)
+            except sqlite3.Error as e:
+                self.logger.error(f"Error trimming history: {e}")
+            return
+        
+        if self._trim_history():
+            self._save_history()
+    
+    def get_history(self, limit: int = 50, offset: int = 0) -> List[PromptHistoryItem]:
+        """Get a page of history items, newest first."""
+        return self.search_history("", limit, offset)
     
-    def search_history(self, search_term: str) -> List[PromptHistoryItem]:
-        """Search prompt history."""
+    def count_history(self, search_term: str = "") -> int:
+        """Count the history items matching a search term (all items if it is empty)."""
+        if self._db is not None:
+            return self._db.count_history(search_term.strip() and search_term)
+        if not search_term.strip():
+            return len(self._history)
+        return len(self._history_matches(search_term))
+    
+    def search_history(self, search_term: str, limit: Optional[int] = None,
+                       offset: int = 0) -> List[PromptHistoryItem]:
+        """Search prompt history, newest first.
+        
+        Returns the matches from offset on, at most limit of them (all when
+        limit is None), so large histories can be shown a page at a time.
+        """
+        if self._db is not None:
+            return self._db.search_history(search_term.strip() and search_term,
+                                           -1 if limit is None else limit, offset)
+        
+        end = offset + limit if limit is not None else None
         if not search_term.strip():
-            return self._history.copy()
+            return list(islice(reversed(self._history.values()), offset, end))
+        return self._history_matches(search_term)[offset:end]
+    
+    def get_most_reused(self, limit: int = DEFAULT_MOST_REUSED) -> List[PromptHistoryItem]:
+        """Get the most often copied prompts, most recently used first among ties."""
+        if self._db is not None:
+            return self._db.get_most_reused(limit)
+        items = list(self._history.values())
+        ranked = heapq.nlargest(limit, range(len(items)),
+                                key=lambda i: (items[i].hit_count, i))
+        return [items[i] for i in ranked]
+    
+    def _history_matches(self, search_term: str) -> List[PromptHistoryItem]:
+        """History items matching search_term, most recently used first.
+        
+        The last result is cached so paging through a search does not
+        rescan the whole history for every page.
+        """
+        key = (search_term.lower(), self._history_generation)
+        if self._last_search is not None and self._last_search[0] == key:
+            return self._last_search[1]
         
         search_term = search_term.lower()
-        return [item for item in self._history 
-                if search_term in item.prompt.lower() or 
-                search_term in item.style_used.lower()]
+        # Snapshot the items; searches may run on a background thread
+        history = list(self._history.values())
+        matches = [item for item in reversed(history)
+                   if search_term in item.prompt.lower() or 
+                   search_term in item.style_used.lower()]
+        self._last_search = (key, matches)
+        return matches
     
     def clear_history(self) -> bool:
         """Clear prompt history."""
         try:
-            self._history.clear()
-            self._save_history()
+            if self._db is not None:
+                self._db.clear_history()
+            else:
+                self._history.clear()
+                self._history_generation += 1
+                self._save_history()
             self.logger.info("Prompt history cleared")
             return True
         except Exception as e:
@@ -157,12 +376,13 @@ class PromptManager:
     def export_history(self, file_path: str, format_type: str = "json") -> bool:
         """Export history to file in specified format."""
         try:
+            history = self.search_history("")
             if format_type.lower() == "json":
                 with open(file_path, 'w', encoding='utf-8') as file:
-                    json.dump([asdict(item) for item in self._history], file, indent=2)
+                    json.dump([asdict(item) for item in history], file, indent=2)
             elif format_type.lower() == "txt":
                 with open(file_path, 'w', encoding='utf-8') as file:
-                    for item in self._history:
+                    for item in history:
                         file.write(f"[{item.timestamp}] {item.prompt}\n")
             else:
                 raise ValueError(f"Unsupported format: {format_type}")
@@ -173,7 +393,8 @@ class PromptManager:
             self.logger.error(f"Failed to export history: {e}")
             return False
     
-    def validate_prompt(self, prompt: str) -> List[str]:
+    @staticmethod
+    def validate_prompt(prompt: str) -> List[str]:
         """Validate prompt and return list of potential issues."""
         issues = []
         
@@ -192,52 +413,141 @@ class PromptManager:
         
         return issues
     
-    def _load_templates(self) -> None:
-        """Load templates from file."""
-        if not os.path.exists(self.templates_file):
-            return
+    def flush(self) -> None:
+        """Wait until every queued file write is on disk."""
+        self._writer.flush()
+    
+    def close(self) -> None:
+        """Finish queued writes and release the storage backend."""
+        self._writer.close()
+        if self._db is not None:
+            self._db.close()
+    
+    def _open_database(self) -> None:
+        """Open the SQLite store, importing the JSON files the first time.
+        
+        Falls back to the JSON files if the database cannot be opened.
+        """
+        from prompt_database import PromptDatabase, DATABASE_FILENAME
         
         try:
-            with open(self.templates_file, 'r', encoding='utf-8') as file:
-                templates_data = json.load(file)
-            
-            self._templates = [PromptTemplate(**data) for data in templates_data]
-        except (IOError, json.JSONDecodeError, TypeError) as e:
-            self.logger.error(f"Error loading templates: {e}")
+            self._db = PromptDatabase(os.path.join(self.data_folder, DATABASE_FILENAME))
+            if self._db.is_new:
+                self._load_templates()
+                self._load_history()
+                self._db.import_data(self._templates.values(), list(self._history.values()))
+                self.logger.info(f"Imported {len(self._templates)} templates and "
+                                 f"{len(self._history)} history items into {DATABASE_FILENAME}")
+                self._templates = TemplateIndex()
+                self._history.clear()
+        except sqlite3.Error as e:
+            self.logger.error(f"Error opening prompt database, using JSON files: {e}")
+            self._db = None
+            self._templates = TemplateIndex()
+            self._history.clear()
+            self._load_templates()
+            self._load_history()
+    
+    def _load_templates(self) -> None:
+        """Load templates from file, or from its last good copy."""
+        templates = load_with_backup(self.templates_file, lambda text: [
+            PromptTemplate(**data) for data in json.loads(text)])
+        if templates is not None:
+            self._templates = TemplateIndex(templates)
     
     def _save_templates(self) -> None:
-        """Save templates to file."""
-        try:
-            with open(self.templates_file, 'w', encoding='utf-8') as file:
-                json.dump([asdict(template) for template in self._templates], file, indent=2)
-        except IOError as e:
-            self.logger.error(f"Error saving templates: {e}")
+        """Queue the templates file to be rewritten.
+        
+        The snapshot is taken on the writer thread, so a burst of saves
+        costs one serialization; templates are replaced, never mutated.
+        """
+        templates = self._templates
+        self._writer.replace(self.templates_file, lambda: json.dumps(
+            [asdict(template) for template in templates.values()], indent=2))
     
     def _load_history(self) -> None:
-        """Load history from file."""
-        if not os.path.exists(self.history_file):
+        """Load history from the JSON Lines log, migrating the old JSON file first.
+        
+        A corrupt log is recovered from its last good copy.
+        """
+        if (not os.path.exists(self.history_file) and
+                not os.path.exists(self.history_file + BACKUP_SUFFIX) and
+                os.path.exists(self.legacy_history_file)):
+            self._migrate_legacy_history()
+        
+        history_log = load_with_backup(self.history_file, _parse_history_log)
+        if history_log is None:
+            if os.path.exists(self.history_file):
+                # Unreadable with no good copy; set it aside so new prompts are not appended to it
+                try:
+                    os.replace(self.history_file, self.history_file + ".corrupt")
+                except OSError as e:
+                    self.logger.error(f"Error setting aside corrupt history: {e}")
             return
         
+        records, self._history_log_lines, torn = history_log
+        for data in records:
+            try:
+                self._load_history_item(PromptHistoryItem(**data), "hit_count" not in data)
+            except TypeError:
+                continue  # not a history record
+        
+        self._trim_history()
+        # A torn last line would swallow the next append, so rewrite the log
+        if torn or self._history_log_lines - len(self._history) >= HISTORY_COMPACT_THRESHOLD:
+            self._save_history()
+    
+    def _migrate_legacy_history(self) -> None:
+        """Convert prompt_history.json (newest first) into the JSON Lines log."""
         try:
-            with open(self.history_file, 'r', encoding='utf-8') as file:
+            with open(self.legacy_history_file, 'r', encoding='utf-8') as file:
                 history_data = json.load(file)
             
-            self._history = [PromptHistoryItem(**data) for data in history_data]
-        except (IOError, json.JSONDecodeError, TypeError) as e:
-            self.logger.error(f"Error loading history: {e}")
+            for data in reversed(history_data):
+                self._load_history_item(PromptHistoryItem(**data), True)
+            self._save_history()
+            self._writer.flush()  # the new log must be on disk before the old file goes
+            self._history.clear()
+            os.replace(self.legacy_history_file, self.legacy_history_file + ".migrated")
+            self.logger.info(f"Migrated {len(history_data)} history items to {HISTORY_FILENAME}")
+        except (IOError, OSError, json.JSONDecodeError, TypeError) as e:
+            self.logger.error(f"Error migrating history: {e}")
+    
+    def _load_history_item(self, item: PromptHistoryItem, legacy: bool) -> None:
+        """Add a stored item, replacing an older record of the same prompt.
+        
+        Later records of a prompt carry its running hit count; legacy records
+        without one are counted as single uses and merged here.
+        """
+        content_hash = prompt_hash(item.prompt)
+        previous = self._history.pop(content_hash, None)
+        if previous is not None and legacy:
+            item.timestamp = previous.timestamp
+            item.hit_count += previous.hit_count
+        self._history[content_hash] = item
+    
+    def _trim_history(self) -> bool:
+        """Drop the least recently used items beyond max_history; True if any were dropped."""
+        if not self.max_history or len(self._history) <= self.max_history:
+            return False
+        while len(self._history) > self.max_history:
+            self._history.popitem(last=False)
+        self._history_generation += 1
+        return True
+    
+    def _append_history(self, item: PromptHistoryItem) -> None:
+        """Queue one history item to be appended to the history log."""
+        self._writer.append(self.history_file, json.dumps(asdict(item), ensure_ascii=False) + "\n")
+        self._history_log_lines += 1
     
     def _save_history(self) -> None:
-        """Save history to file."""
-        try:
-            with open(self.history_file, 'w', encoding='utf-8') as file:
-                json.dump([asdict(item) for item in self._history], file, indent=2)
-        except IOError as e:
-            self.logger.error(f"Error saving history: {e}")
+        """Queue the history log to be compacted down to the retained items."""
+        items = list(self._history.values())  # history items are replaced, never mutated
+        # An empty history is written as a blank line: an empty file reads as a crashed write
+        self._writer.replace(self.history_file, lambda: "".join(
+            json.dumps(asdict(item), ensure_ascii=False) + "\n" for item in items) or "\n")
+        self._history_log_lines = len(items)
     
     def _append_to_log(self, prompt: str) -> None:
-        """Append prompt to log file."""
-        try:
-            with open(self.log_file, 'a', encoding='utf-8') as file:
-                file.write(f"[{datetime.now().isoformat()}] {prompt}\n")
-        except IOError as e:
-            self.logger.error(f"Error appending to log: {e}")
+        """Queue prompt to be appended to the log file."""
+        self._writer.append(self.log_file, f"[{datetime.now().isoformat()}] {prompt}\n")
@@ -0,0 +1,336 @@
+"""Streaming bulk import of style lists for MAT."""
+import os
+import re
+import csv
+import json
+import codecs
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, Optional, Set, TextIO, Tuple
+
+from style_manager import StyleManager
+
+CHUNK_SIZE = 64 * 1024
+MAX_STYLE_LENGTH = 200
+TEMP_SUFFIX = ".import-tmp"
+DEFAULT_CATEGORY = "Imported"
+
+class ImportCancelled(Exception):
+    """Raised when an import is cancelled before it is committed."""
+
+@dataclass
+class ImportResult:
+    """Summary of a style import."""
+    lines_read: int = 0
+    duplicates: int = 0
+    invalid: int = 0
+    added: Dict[str, int] = field(default_factory=dict)
+    
+    @property
+    def total_added(self) -> int:
+        return sum(self.added.values())
+
+def normalize_style(style: str) -> str:
+    """Collapse whitespace in a style name; returns '' for unusable names."""
+    style = " ".join(str(style).split())
+    if len(style) > MAX_STYLE_LENGTH:
+        return ""
+    return style
+
+def normalize_category(category: str) -> str:
+    """Turn a category name into a safe style file name (without .txt)."""
+    category = re.sub(r"[^A-Za-z0-9 _-]", "", str(category)).strip()
+    return category or DEFAULT_CATEGORY
+
+class _ByteCountingReader:
+    """Reads a binary file as text lines or chunks while counting bytes consumed."""
+    
+    def __init__(self, file):
+        self.file = file
+        self.bytes_read = 0
+        self._decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    
+    def lines(self) -> Iterator[str]:
+        for raw in self.file:
+            self.bytes_read += len(raw)
+            yield self._decoder.decode(raw)
+    
+    def read(self) -> str:
+        raw = self.file.read(CHUNK_SIZE)
+        self.bytes_read += len(raw)
+        return self._decoder.decode(raw, final=not raw)
+
+class StyleImporter:
+    """Streams large text, CSV or JSON style lists into the Styles folder.
+    
+    Input is parsed record by record and new styles are written straight
+    to temporary copies of the target category files, so only the
+    de-duplication keys are held in memory. The temporary files replace
+    the originals with os.replace once the whole input has been read.
+    """
+    
+    def __init__(self, style_manager: StyleManager):
+        self.style_manager = style_manager
+        self.styles_folder = style_manager.styles_folder
+        self.logger = logging.getLogger(__name__)
+        self._outputs: Dict[str, TextIO] = {}
+        self._seen: Dict[str, Set[str]] = {}
+    
+    def import_file(self, file_path: str, default_category: Optional[str] = None,
+                    progress: Optional[Callable[[int], None]] = None,
+                    cancel_event: Optional[threading.Event] = None) -> ImportResult:
+        """Import styles from file_path and return a summary.
+        
+        Records without a category go to default_category (the file name by
+        default). progress, if given, is called with a 0-100 percentage and
+        may be called from a worker thread.
+        """
+        if default_category is None:
+            default_category = os.path.splitext(os.path.basename(file_path))[0]
+        default_category = normalize_category(default_category)
+        
+        result = ImportResult()
+        total_bytes = max(1, os.path.getsize(file_path))
+        last_percent = -1
+        
+        try:
+            with open(file_path, 'rb') as file:
+                reader = _ByteCountingReader(file)
+                for style, category in self._iter_records(file_path, reader):
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise ImportCancelled()
+                    
+                    result.lines_read += 1
+                    self._add_style(style, category or default_category, result)
+                    
+                    percent = reader.bytes_read * 100 // total_bytes
+                    if progress and percent != last_percent:
+                        last_percent = percent
+                        progress(percent)
+            
+            self._commit(result)
+        except BaseException:
+            self._discard()
+            raise
+        finally:
+            self._outputs.clear()
+            self._seen.clear()
+        
+        if progress:
+            progress(100)
+        self.logger.info(f"Imported {result.total_added} styles from {file_path} "
+                         f"({result.duplicates} duplicates, {result.invalid} invalid)")
+        return result
+    
+    def _iter_records(self, file_path: str, reader: _ByteCountingReader) -> Iterator[Tuple[Optional[str], Optional[str]]]:
+        """Yield (style, category) records according to the file extension; None styles are invalid."""
+        extension = os.path.splitext(file_path)[1].lower()
+        if extension == ".csv":
+            return self._iter_csv(reader)
+        if extension == ".jsonl":
+            return self._iter_json_lines(reader)
+        if extension == ".json":
+            return self._iter_json(reader)
+        return ((line, None) for line in reader.lines())
+    
+    def _iter_csv(self, reader: _ByteCountingReader) -> Iterator[Tuple[str, Optional[str]]]:
+        """CSV rows: 'style'/'name' and 'category' columns, or style[,category]."""
+        rows = csv.reader(reader.lines())
+        style_column, category_column = 0, 1
+        
+        for row_number, row in enumerate(rows):
+            if not row:
+                continue
+            if row_number == 0:
+                header = [cell.strip().lower() for cell in row]
+                if "style" in header or "name" in header:
+                    style_column = header.index("style" if "style" in header else "name")
+                    category_column = header.index("category") if "category" in header else None
+                    continue
+            
+            style = row[style_column] if style_column < len(row) else ""
+            category = None
+            if category_column is not None and category_column < len(row):
+                category = row[category_column].strip() or None
+            yield style, category
+    
+    def _iter_json_lines(self, reader: _ByteCountingReader) -> Iterator[Tuple[Optional[str], Optional[str]]]:
+        """JSON Lines: each line is a style string or a {style, category} object."""
+        for line in reader.lines():
+            if not line.strip():
+                continue
+            try:
+                yield from self._records_from_value(json.loads(line))
+            except json.JSONDecodeError:
+                yield None, None
+    
+    def _iter_json(self, reader: _ByteCountingReader) -> Iterator[Tuple[Optional[str], Optional[str]]]:
+        """A JSON array of records, or an object mapping categories to style lists.
+        
+        Elements are decoded one at a time from a rolling buffer, so the
+        document is never loaded whole; neither is a category's style list.
+        A document cut off before its closing bracket raises ValueError.
+        """
+        decoder = json.JSONDecoder()
+        buffer, position, eof = "", 0, False
+        
+        def fill() -> bool:
+            nonlocal buffer, position, eof
+            chunk = reader.read()
+            if not chunk:
+                eof = True
+                return False
+            buffer = buffer[position:] + chunk
+            position = 0
+            return True
+        
+        def skip_whitespace() -> str:
+            nonlocal position
+            while True:
+                while position < len(buffer) and buffer[position].isspace():
+                    position += 1
+                if position < len(buffer):
+                    return buffer[position]
+                if not fill():
+                    return ""
+        
+        def decode_value():
+            nonlocal position
+            skip_whitespace()
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buffer, position)
+                    # A value ending exactly at the buffer edge may be cut short
+                    if end < len(buffer) or eof:
+                        position = end
+                        return value
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                fill()
+        
+        def elements(closing: str) -> Iterator[None]:
+            """Stop at each element of the open array or object, then consume its closing bracket."""
+            nonlocal position
+            expect = "first"  # then "separator" after each element, "element" after each comma
+            while True:
+                char = skip_whitespace()
+                if not char:
+                    raise ValueError("JSON style list ends before its closing bracket")
+                if expect == "separator":
+                    if char == closing:
+                        position += 1
+                        return
+                    if char != ",":
+                        raise ValueError("Malformed JSON style list: missing comma between elements")
+                    position += 1
+                    expect = "element"
+                    continue
+                if char == closing and expect == "first":
+                    position += 1
+                    return
+                if char in (",", closing):
+                    raise ValueError("Malformed JSON style list: misplaced comma")
+                yield
+                expect = "separator"
+        
+        opening = skip_whitespace()
+        if opening not in ("[", "{"):
+            raise ValueError("JSON style list must be an array or an object")
+        position += 1
+        
+        if opening == "[":
+            for _ in elements("]"):
+                yield from self._records_from_value(decode_value())
+            return
+        
+        for _ in elements("}"):
+            category = decode_value()
+            if skip_whitespace() != ":":
+                raise ValueError("Malformed JSON object in style list")
+            position += 1
+            if skip_whitespace() == "[":
+                position += 1
+                for _ in elements("]"):
+                    yield from self._records_from_value(decode_value(), category)
+            else:
+                yield from self._records_from_value(decode_value(), category)
+    
+    def _records_from_value(self, value, category: Optional[str] = None) -> Iterator[Tuple[Optional[str], Optional[str]]]:
+        """Turn a decoded JSON value into (style, category) records.
+        
+        Values that are not a style string or a {style, category} object
+        give a None style, which is counted as invalid.
+        """
+        if isinstance(value, dict):
+            style = value.get("style") or value.get("name")
+            yield (style if isinstance(style, str) else None,
+                   value.get("category") or category)
+        elif isinstance(value, str):
+            yield value, category
+        else:
+            yield None, category
+    
+    def _add_style(self, style: Optional[str], category: str, result: ImportResult) -> None:
+        """Normalize, de-duplicate and write one style to its category's temp file."""
+        if style is None:
+            result.invalid += 1
+            return
+        if not style.strip():
+            return
+        style = normalize_style(style)
+        if not style:
+            result.invalid += 1
+            return
+        
+        category = normalize_category(category)
+        output = self._open_output(category)
+        key = style.casefold()
+        seen = self._seen[category]
+        if key in seen:
+            result.duplicates += 1
+            return
+        
+        seen.add(key)
+        output.write(style + "\n")
+        result.added[category] = result.added.get(category, 0) + 1
+    
+    def _open_output(self, category: str) -> TextIO:
+        """Open a category's temp file, seeded with its existing styles."""
+        output = self._outputs.get(category)
+        if output is not None:
+            return output
+        
+        target = os.path.join(self.styles_folder, f"{category}.txt")
+        output = open(target + TEMP_SUFFIX, 'w', encoding='utf-8')
+        self._outputs[category] = output
+        seen = self._seen[category] = set()
+        
+        if os.path.exists(target):
+            with open(target, 'r', encoding='utf-8') as existing:
+                for line in existing:
+                    style = line.strip()
+                    if style:
+                        seen.add(style.casefold())
+                        output.write(style + "\n")
+        return output
+    
+    def _commit(self, result: ImportResult) -> None:
+        """Replace each category file that gained styles with its temp file."""
+        for category, output in self._outputs.items():
+            output.close()
+            target = os.path.join(self.styles_folder, f"{category}.txt")
+            if result.added.get(category):
+                os.replace(target + TEMP_SUFFIX, target)
+            else:
+                os.remove(target + TEMP_SUFFIX)
+    
+    def _discard(self) -> None:
+        """Remove temp files after a failed or cancelled import."""
+        for category, output in self._outputs.items():
+            output.close()
+            try:
+                os.remove(os.path.join(self.styles_folder, f"{category}.txt{TEMP_SUFFIX}"))
+            except OSError:
+                pass
@@ -0,0 +1,484 @@
+"""Catalog-wide style indexes for MAT."""
+import re
+import heapq
+import random
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+NGRAM_SIZE = 3
+TOKEN_PATTERN = re.compile(r"\w+")
+
+def _ngrams(text: str) -> Set[str]:
+    """Return the set of character trigrams in text."""
+    return {text[i:i + NGRAM_SIZE] for i in range(len(text) - NGRAM_SIZE + 1)}
+
+def _tokenize(text: str) -> List[str]:
+    """Split lowercased text into word tokens."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+def _max_typos(token: str) -> int:
+    """Number of edits tolerated for a query token of this length."""
+    if len(token) <= 3:
+        return 0
+    if len(token) <= 7:
+        return 1
+    return 2
+
+def _match_masks(pattern: str) -> Dict[str, int]:
+    """Bit mask of the positions of each character in pattern."""
+    masks: Dict[str, int] = {}
+    for i, char in enumerate(pattern):
+        masks[char] = masks.get(char, 0) | (1 << i)
+    return masks
+
+def levenshtein(pattern: str, text: str, masks: Optional[Dict[str, int]] = None) -> int:
+    """Edit distance between pattern and text.
+    
+    Uses Myers' bit-parallel algorithm, which is linear in len(text). Pass
+    the result of _match_masks(pattern) to reuse it across many texts.
+    """
+    m = len(pattern)
+    if not m:
+        return len(text)
+    if masks is None:
+        masks = _match_masks(pattern)
+    
+    full = (1 << m) - 1
+    last = 1 << (m - 1)
+    pv, mv, score = full, 0, m
+    for char in text:
+        eq = masks.get(char, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & full)
+        mh = pv & xh
+        if ph & last:
+            score += 1
+        elif mh & last:
+            score -= 1
+        ph = ((ph << 1) | 1) & full
+        mh = (mh << 1) & full
+        pv = mh | (~(xv | ph) & full)
+        mv = ph & xv
+    return score
+
+class BKTree:
+    """Burkhard-Keller tree for edit-distance bounded lookups."""
+    
+    def __init__(self, words: Iterable[str] = ()):
+        self._root: Optional[Tuple[str, Dict[int, tuple]]] = None
+        for word in words:
+            self.add(word)
+    
+    def add(self, word: str) -> None:
+        """Insert a word into the tree."""
+        if self._root is None:
+            self._root = (word, {})
+            return
+        
+        masks = _match_masks(word)
+        node = self._root
+        while True:
+            distance = levenshtein(word, node[0], masks)
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = (word, {})
+                return
+            node = child
+    
+    def search(self, word: str, max_distance: int) -> List[Tuple[int, str]]:
+        """Return (distance, word) pairs within max_distance of word."""
+        if self._root is None:
+            return []
+        
+        masks = _match_masks(word)
+        results = []
+        stack = [self._root]
+        while stack:
+            node_word, children = stack.pop()
+            distance = levenshtein(word, node_word, masks)
+            if distance <= max_distance:
+                results.append((distance, node_word))
+            low, high = distance - max_distance, distance + max_distance
+            stack.extend(child for d, child in children.items() if low <= d <= high)
+        return results
+
+class AliasSampler:
+    """Weighted sampling in O(1) per draw using Vose's alias method."""
+    
+    def __init__(self, weights: Sequence[float]):
+        count = len(weights)
+        total = float(sum(weights))
+        if not count or total <= 0:
+            raise ValueError("AliasSampler needs at least one positive weight")
+        
+        self._count = count
+        self._probability = array('d', [1.0]) * count
+        self._alias = array('I', [0]) * count
+        
+        scaled = [weight * count / total for weight in weights]
+        small = [i for i, value in enumerate(scaled) if value < 1.0]
+        large = [i for i, value in enumerate(scaled) if value >= 1.0]
+        while small and large:
+            low, high = small.pop(), large.pop()
+            self._probability[low] = scaled[low]
+            self._alias[low] = high
+            scaled[high] += scaled[low] - 1.0
+            (small if scaled[high] < 1.0 else large).append(high)
+    
+    def __len__(self) -> int:
+        return self._count
+    
+    def sample(self, rng: random.Random = random) -> int:
+        """Draw one index with probability proportional to its weight."""
+        column = int(rng.random() * self._count)
+        if rng.random() < self._probability[column]:
+            return column
+        return self._alias[column]
+
+class StyleIndex:
+    """Trigram inverted index over every unique style name in the catalog.
+    
+    Style ids are assigned in relevance order (shorter names first, then
+    alphabetical), so sorting a set of ids yields ranked results.
+    """
+    
+    def __init__(self, styles_by_category: Dict[str, List[str]]):
+        unique = {style for styles in styles_by_category.values() for style in styles}
+        self.names: List[str] = sorted(unique, key=lambda x: (len(x), x.lower()))
+        self._lowered: List[str] = [name.lower() for name in self.names]
+        self._ids: Dict[str, int] = {name: i for i, name in enumerate(self.names)}
+        
+        # Categories get compact integer ids; each style keeps the ids of
+        # the categories that list it (the style -> categories reverse index)
+        self.categories: List[str] = sorted(styles_by_category)
+        self._category_ids: Dict[str, Set[int]] = {}
+        style_categories: List[List[int]] = [[] for _ in self.names]
+        for category_id, category in enumerate(self.categories):
+            members = {self._ids[style] for style in styles_by_category[category]}
+            self._category_ids[category] = members
+            for style_id in members:
+                style_categories[style_id].append(category_id)
+        self._style_categories: List[Tuple[int, ...]] = [tuple(ids) for ids in style_categories]
+        
+        self._postings: Dict[str, Set[int]] = {}
+        self._token_ids: Dict[str, Set[int]] = {}
+        for style_id, lowered in enumerate(self._lowered):
+            for gram in _ngrams(lowered):
+                self._postings.setdefault(gram, set()).add(style_id)
+            for token in _tokenize(lowered):
+                self._token_ids.setdefault(token, set()).add(style_id)
+        
+        self._sorted_tokens: List[str] = sorted(self._token_ids)
+        self._token_tree = BKTree(self._sorted_tokens)
+    
+    def __len__(self) -> int:
+        return len(self.names)
+    
+    def categories_for(self, style: str) -> List[str]:
+        """Return the categories that list style, in alphabetical order."""
+        style_id = self._ids.get(style)
+        if style_id is None:
+            return []
+        return [self.categories[category_id] for category_id in self._style_categories[style_id]]
+    
+    def fuzzy_search(self, search_term: str, categories: Optional[Iterable[str]] = None,
+                     limit: Optional[int] = None) -> List[Tuple[str, int]]:
+        """Typo-tolerant search returning the best (style, score) pairs.
+        
+        Exact substring matches score 0. Otherwise every query word must match
+        a word of the style within a small edit distance (the last word may
+        also match as a prefix), and the score is 1 plus the summed distance.
+        Lower scores rank first; ties keep the index relevance order.
+        """
+        allowed = None
+        if categories is not None:
+            allowed = set()
+            for category in categories:
+                allowed |= self._category_ids.get(category, set())
+        
+        scores: Dict[int, int] = {style_id: 0 for style_id
+                                  in self._substring_ids(search_term.lower(), allowed)}
+        
+        query_tokens = _tokenize(search_term)
+        token_scores = None
+        for position, token in enumerate(query_tokens):
+            is_last = position == len(query_tokens) - 1
+            matched = self._match_token(token, allow_prefix=is_last)
+            if token_scores is None:
+                token_scores = matched
+            else:
+                token_scores = {style_id: distance + matched[style_id]
+                                for style_id, distance in token_scores.items()
+                                if style_id in matched}
+            if not token_scores:
+                break
+        
+        for style_id, distance in (token_scores or {}).items():
+            if style_id not in scores and (allowed is None or style_id in allowed):
+                scores[style_id] = 1 + distance
+        
+        if limit is None:
+            best = sorted(scores.items(), key=lambda x: (x[1], x[0]))
+        else:
+            best = heapq.nsmallest(limit, scores.items(), key=lambda x: (x[1], x[0]))
+        return [(self.names[style_id], score) for style_id, score in best]
+    
+    def _substring_ids(self, search_term: str, allowed: Optional[Set[int]]) -> List[int]:
+        """Ids of the styles containing the lowercased search_term, limited to allowed."""
+        candidates = self._candidates(search_term)
+        if candidates is None:
+            candidates = allowed if allowed is not None else range(len(self.names))
+        elif allowed is not None:
+            candidates &= allowed
+        lowered = self._lowered
+        return [style_id for style_id in candidates if search_term in lowered[style_id]]
+    
+    def _match_token(self, token: str, allow_prefix: bool) -> Dict[int, int]:
+        """Map style ids to the smallest edit distance of any word matching token."""
+        matches: Dict[int, int] = {}
+        
+        def record(word: str, distance: int) -> None:
+            for style_id in self._token_ids[word]:
+                if distance < matches.get(style_id, distance + 1):
+                    matches[style_id] = distance
+        
+        max_typos = _max_typos(token)
+        if max_typos:
+            for distance, word in self._token_tree.search(token, max_typos):
+                record(word, distance)
+        elif token in self._token_ids:
+            record(token, 0)
+        
+        if allow_prefix:
+            words = self._sorted_tokens
+            position = bisect_left(words, token)
+            while position < len(words) and words[position].startswith(token):
+                record(words[position], 0)
+                position += 1
+        return matches
+    
+    def _candidates(self, search_term: str) -> Optional[Set[int]]:
+        """Intersect posting lists for the term; None means no trigram filter applies."""
+        grams = _ngrams(search_term)
+        if not grams:
+            return None
+        
+        postings = []
+        for gram in grams:
+            posting = self._postings.get(gram)
+            if not posting:
+                return set()
+            postings.append(posting)
+        
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates &= posting
+            if not candidates:
+                break
+        return candidates
+
+class PrefixIndex:
+    """Usage-ranked prefix completion over style names.
+    
+    Keys are the lowercased names and every word-start suffix of them (so
+    "nouv" finds "Art Nouveau"), kept in a sorted array searched with
+    bisect. The best completions of every prefix up to SHORT_PREFIX_LENGTH
+    characters are precomputed, since those ranges are the widest; longer
+    prefixes only cover a handful of keys.
+    """
+    
+    SHORT_PREFIX_LENGTH = 3
+    TOP_SIZE = 20
+    
+    def __init__(self, names: Sequence[str], scores: Sequence[float]):
+        self.names = names
+        self._scores = scores
+        
+        entries = set()
+        for style_id, name in enumerate(names):
+            lowered = name.lower()
+            for match in TOKEN_PATTERN.finditer(lowered):
+                entries.add((lowered[match.start():], style_id))
+            entries.add((lowered, style_id))
+        entries = sorted(entries)
+        self._keys: List[str] = [key for key, _ in entries]
+        self._key_ids = array('I', [style_id for _, style_id in entries])
+        
+        self._top: Dict[str, List[int]] = {}
+        prefixes = {key[:length] for key in self._keys
+                    for length in range(1, self.SHORT_PREFIX_LENGTH + 1)}
+        for prefix in prefixes:
+            self._top[prefix] = self._best(prefix, self.TOP_SIZE)
+    
+    def complete(self, prefix: str, limit: int = 10) -> List[str]:
+        """Return up to limit styles with a name or word starting with prefix.
+        
+        Ranked by usage, then by the usual relevance order.
+        """
+        prefix = prefix.lower().lstrip()
+        if not prefix or limit <= 0:
+            return []
+        
+        top = self._top.get(prefix) if len(prefix) <= self.SHORT_PREFIX_LENGTH else None
+        if top is None or limit > self.TOP_SIZE:
+            top = self._best(prefix, limit)
+        return [self.names[style_id] for style_id in top[:limit]]
+    
+    def _best(self, prefix: str, limit: int) -> List[int]:
+        """Best-ranked style ids among the keys starting with prefix."""
+        keys = self._keys
+        start = bisect_left(keys, prefix)
+        end = bisect_left(keys, prefix + "\uffff", start)
+        style_ids = set(self._key_ids[start:end])
+        scores = self._scores
+        return heapq.nsmallest(limit, style_ids, key=lambda i: (-scores[i], i))
+
+TAG_QUERY_PATTERN = re.compile(r"\(|\)|[^\s()]+")
+TAG_OPERATORS = ("AND", "OR", "NOT")
+
+def normalize_tag(tag: str) -> str:
+    """Lowercase a tag and join its words with hyphens."""
+    return "-".join(str(tag).lower().split())
+
+def _bitset(ids: Iterable[int], size: int) -> int:
+    """Pack style ids into an int with bit i set for every id i."""
+    packed = bytearray((size + 7) // 8)
+    for style_id in ids:
+        packed[style_id >> 3] |= 1 << (style_id & 7)
+    return int.from_bytes(packed, 'little')
+
+def _bitset_ids(bitset: int) -> List[int]:
+    """Unpack the set bits of a bitset into ascending style ids."""
+    ids = []
+    packed = bitset.to_bytes((bitset.bit_length() + 7) // 8, 'little')
+    for byte_index, byte in enumerate(packed):
+        while byte:
+            low_bit = byte & -byte
+            ids.append(byte_index * 8 + low_bit.bit_length() - 1)
+            byte ^= low_bit
+    return ids
+
+class TagIndex:
+    """Per-tag bitsets over the style ids of a StyleIndex.
+    
+    Every category doubles as a tag (its lowercased name), and sidecar tag
+    files add tags to individual styles. Boolean tag queries are evaluated
+    with bitwise operations on Python ints across the whole catalog.
+    """
+    
+    def __init__(self, style_index: StyleIndex, tags_by_category: Dict[str, Dict[str, List[str]]]):
+        self._style_index = style_index
+        self._size = len(style_index)
+        self._universe = (1 << self._size) - 1
+        
+        self._category_bitsets: Dict[str, int] = {}
+        tag_ids: Dict[str, Set[int]] = {}
+        style_tags: Dict[int, Set[str]] = {}
+        for category, members in style_index._category_ids.items():
+            self._category_bitsets[category] = _bitset(members, self._size)
+            tag_ids.setdefault(normalize_tag(category), set()).update(members)
+        for styles in tags_by_category.values():
+            for style, tags in styles.items():
+                style_id = style_index._ids.get(style)
+                if style_id is None:
+                    continue  # tagged style is no longer listed in its category
+                for tag in tags:
+                    tag_ids.setdefault(tag, set()).add(style_id)
+                    style_tags.setdefault(style_id, set()).add(tag)
+        
+        self._bitsets: Dict[str, int] = {tag: _bitset(ids, self._size) for tag, ids in tag_ids.items()}
+        self._counts: Dict[str, int] = {tag: len(ids) for tag, ids in tag_ids.items()}
+        self._sorted_tags: List[str] = sorted(self._bitsets)
+        self._style_tags: Dict[int, List[str]] = {style_id: sorted(tags) for style_id, tags in style_tags.items()}
+    
+    def tags(self) -> List[Tuple[str, int]]:
+        """Return every (tag, style count) pair, alphabetically."""
+        return [(tag, self._counts[tag]) for tag in self._sorted_tags]
+    
+    def tags_for(self, style: str) -> List[str]:
+        """Return the sidecar tags of a style (category tags excluded)."""
+        style_id = self._style_index._ids.get(style)
+        return self._style_tags.get(style_id, [])
+    
+    def query(self, expression: str, categories: Optional[Iterable[str]] = None) -> List[str]:
+        """Return the styles matching a boolean tag expression, ranked.
+        
+        Tags combine with AND, OR, NOT and parentheses; adjacent tags are
+        ANDed and a trailing * matches every tag with that prefix, e.g.
+        "portraits AND dark AND NOT erotic" or "(retro OR vivid) cyber*".
+        Raises ValueError for malformed expressions.
+        """
+        tokens = TAG_QUERY_PATTERN.findall(expression)
+        if not tokens:
+            return []
+        
+        position = 0
+        
+        def peek() -> Optional[str]:
+            return tokens[position] if position < len(tokens) else None
+        
+        def parse_or() -> int:
+            nonlocal position
+            result = parse_and()
+            while peek() is not None and peek().upper() == "OR":
+                position += 1
+                result |= parse_and()
+            return result
+        
+        def parse_and() -> int:
+            nonlocal position
+            result = parse_not()
+            while peek() is not None and peek() != ")" and peek().upper() != "OR":
+                if peek().upper() == "AND":
+                    position += 1
+                result &= parse_not()
+            return result
+        
+        def parse_not() -> int:
+            nonlocal position
+            token = peek()
+            if token is None:
+                raise ValueError("Tag filter ends unexpectedly")
+            position += 1
+            if token.upper() == "NOT":
+                return self._universe & ~parse_not()
+            if token == "(":
+                result = parse_or()
+                if peek() != ")":
+                    raise ValueError("Missing ')' in tag filter")
+                position += 1
+                return result
+            if token == ")" or token.upper() in TAG_OPERATORS:
+                raise ValueError(f"Unexpected '{token}' in tag filter")
+            return self._tag_bitset(token)
+        
+        result = parse_or()
+        if position != len(tokens):
+            raise ValueError(f"Unexpected '{tokens[position]}' in tag filter")
+        
+        if categories is not None:
+            allowed = 0
+            for category in categories:
+                allowed |= self._category_bitsets.get(category, 0)
+            result &= allowed
+        
+        names = self._style_index.names
+        return [names[style_id] for style_id in _bitset_ids(result)]
+    
+    def _tag_bitset(self, tag: str) -> int:
+        """Bitset for one tag, or the union of all tags with a prefix ending in *."""
+        if not tag.endswith("*"):
+            return self._bitsets.get(normalize_tag(tag), 0)
+        
+        prefix = normalize_tag(tag[:-1])
+        result = 0
+        position = bisect_left(self._sorted_tags, prefix)
+        while position < len(self._sorted_tags) and self._sorted_tags[position].startswith(prefix):
+            result |= self._bitsets[self._sorted_tags[position]]
+            position += 1
+        return result
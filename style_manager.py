@@ -1,10 +1,45 @@
 """Style management module for MAT."""
 import os
+import sys
+import time
+import heapq
+import bisect
 import logging
-from typing import List, Dict, Set, Optional
+import threading
+from array import array
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Callable, List, Dict, Set, Optional, Tuple
 from dataclasses import dataclass
 import json
 
+from style_index import StyleIndex, AliasSampler, PrefixIndex, TagIndex, normalize_tag
+from style_similarity import SIMILARITY_AVAILABLE, StyleSimilarity, load_or_build
+from persistence import atomic_write, load_with_backup, sync_later
+
+CATALOG_FILENAME = "_catalog.json"
+CATALOG_VERSION = 1
+TAGS_EXTENSION = ".tags"  # sidecar tag file next to each category's .txt
+DEFAULT_SEARCH_LIMIT = 100
+SIMILARITY_FILENAME = "_similarity.npz"
+DEFAULT_SIMILAR_LIMIT = 30
+DEFAULT_COMPLETION_LIMIT = 10
+PREFIX_USAGE_REBUILD = 20  # usage events before completions are re-ranked
+METADATA_FLUSH_THRESHOLD = 25  # pending metadata changes before a write
+USAGE_LOG_FILENAME = "_usage_log.jsonl"
+USAGE_LOG_COMPACT_THRESHOLD = 1000  # logged events before folding into metadata
+USAGE_HALF_LIFE = 30 * 24 * 3600  # seconds for a use to lose half its weight
+MIN_DECAYED_SCORE = 0.01  # scores below this are dropped on compaction
+POPULAR_TOP_SIZE = 50
+RANDOM_WEIGHTINGS = ("size", "usage", "favorites")
+FAVORITE_WEIGHT = 5.0  # how much likelier a favorite is to be picked at random
+SAMPLER_USAGE_REBUILD = 50  # usage events before the usage-weighted sampler is rebuilt
+RANDOM_HISTORY_SIZE = 100  # longest no-repeat window supported
+RANDOM_MAX_ATTEMPTS = 20
+
+# Sampler entries: category names, then each entry's category id and position in it
+SamplerEntries = Tuple[List[str], array, array]
+
 @dataclass
 class StyleItem:
     """Represents a style item with metadata."""
@@ -18,17 +53,182 @@ class StyleItem:
         if self.tags is None:
             self.tags = []
 
+class LRUStyleCache:
+    """Least-recently-used cache of category style lists.
+    
+    The cache is bounded by the total number of style entries and/or an
+    estimate of their size in bytes; a limit of 0 means unbounded. The most
+    recently added category is always kept, even if it alone exceeds a limit.
+    """
+    
+    def __init__(self, max_entries: int = 0, max_bytes: int = 0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[str, Tuple[List[str], int]]" = OrderedDict()
+        self.entries = 0
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def __contains__(self, category: str) -> bool:
+        return category in self._data
+    
+    def get(self, category: str) -> Optional[List[str]]:
+        """Get a category's styles, marking it as recently used."""
+        item = self._data.get(category)
+        if item is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._data.move_to_end(category)
+        return item[0]
+    
+    def peek(self, category: str) -> Optional[List[str]]:
+        """Get a category's styles without touching LRU order or counters."""
+        item = self._data.get(category)
+        return item[0] if item else None
+    
+    def put(self, category: str, styles: List[str]) -> None:
+        """Store a category's styles and evict old categories over the limits."""
+        self.pop(category)
+        size = sys.getsizeof(styles) + sum(sys.getsizeof(style) for style in styles)
+        self._data[category] = (styles, size)
+        self.entries += len(styles)
+        self.bytes += size
+        
+        while len(self._data) > 1 and self._over_limit():
+            oldest = next(iter(self._data))
+            self.pop(oldest)
+            self.evictions += 1
+    
+    def pop(self, category: str) -> None:
+        """Remove a category if present."""
+        item = self._data.pop(category, None)
+        if item:
+            self.entries -= len(item[0])
+            self.bytes -= item[1]
+    
+    def clear(self) -> None:
+        """Remove every category."""
+        self._data.clear()
+        self.entries = 0
+        self.bytes = 0
+    
+    def stats(self) -> Dict[str, int]:
+        """Cache size and hit/miss counters."""
+        return {
+            "categories": len(self._data),
+            "entries": self.entries,
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+    
+    def _over_limit(self) -> bool:
+        return ((self.max_entries and self.entries > self.max_entries) or
+                (self.max_bytes and self.bytes > self.max_bytes))
+
+class PopularityTracker:
+    """Exponentially decayed usage scores with an incrementally maintained top-k.
+    
+    Scores are kept relative to reference_time: a use at time t adds
+    2 ** ((t - reference_time) / half_life). Decay scales every score by the
+    same factor, so their order never changes with time alone and the top-k
+    list only needs updating for the style that was just used.
+    """
+    
+    def __init__(self, reference_time: float, scores: Optional[Dict[str, float]] = None,
+                 half_life: float = USAGE_HALF_LIFE, top_size: int = POPULAR_TOP_SIZE):
+        self.reference_time = reference_time
+        self.half_life = half_life
+        self.top_size = top_size
+        self.scores: Dict[str, float] = dict(scores or {})
+        self._top: List[Tuple[float, str]] = []  # (-score, style), best first
+        self._rebuild_top()
+    
+    def record(self, style: str, timestamp: float) -> None:
+        """Add one use of style at timestamp."""
+        score = self.scores.get(style, 0.0) + 2 ** ((timestamp - self.reference_time) / self.half_life)
+        self.scores[style] = score
+        
+        for position, (_, name) in enumerate(self._top):
+            if name == style:
+                del self._top[position]
+                break
+        else:
+            if len(self._top) >= self.top_size and -score >= self._top[-1][0]:
+                return
+        
+        bisect.insort(self._top, (-score, style))
+        if len(self._top) > self.top_size:
+            self._top.pop()
+    
+    def top(self, limit: int) -> List[str]:
+        """Styles with the highest decayed scores, best first."""
+        if limit <= self.top_size:
+            return [style for _, style in self._top[:limit]]
+        best = heapq.nsmallest(limit, ((-score, style) for style, score in self.scores.items()))
+        return [style for _, style in best]
+    
+    def rebase(self, now: float) -> None:
+        """Move the reference time to now, dropping negligible scores."""
+        factor = 2 ** ((self.reference_time - now) / self.half_life)
+        self.scores = {style: score * factor for style, score in self.scores.items()
+                       if score * factor >= MIN_DECAYED_SCORE}
+        self.reference_time = now
+        self._rebuild_top()
+    
+    def _rebuild_top(self) -> None:
+        self._top = heapq.nsmallest(self.top_size,
+                                    ((-score, style) for style, score in self.scores.items()))
+
 class StyleManager:
     """Manages style loading, caching, and operations."""
     
-    def __init__(self, styles_folder: str):
+    def __init__(self, styles_folder: str, cache_max_entries: int = 0, cache_max_bytes: int = 0):
         self.styles_folder = styles_folder
         self.logger = logging.getLogger(__name__)
-        self._style_cache: Dict[str, List[str]] = {}
-        self._all_styles: List[StyleItem] = []
+        self._style_cache = LRUStyleCache(cache_max_entries, cache_max_bytes)
         self._favorites: Set[str] = set()
         self._usage_stats: Dict[str, int] = {}
+        self._category_usage: Dict[str, int] = {}
+        self._popularity = PopularityTracker(time.time())
+        self._usage_log_path = os.path.join(styles_folder, USAGE_LOG_FILENAME)
+        self._usage_log_events = 0
+        self._usage_log_torn = False  # last line cut short by a crash
+        self._pending_usage_events: List[Tuple[str, Optional[str], float]] = []
+        self._last_usage_time = 0.0
+        self._metadata_dirty = False
+        self._pending_metadata_changes = 0
+        self._batch_depth = 0
+        self._catalog_path = os.path.join(styles_folder, CATALOG_FILENAME)
+        self._catalog: Dict[str, Dict] = {}
+        self._index: Optional[StyleIndex] = None
+        self._catalog_version = 0
+        self._similarity: Optional[StyleSimilarity] = None
+        self._tags: Dict[str, Dict[str, List[str]]] = {}
+        self._tag_signatures: Dict[str, Tuple[int, int]] = {}
+        self._tag_index: Optional[TagIndex] = None
+        self._prefix_index: Optional[PrefixIndex] = None
+        self._prefix_usage_changes = 0
+        self._prefix_rebuilding = False
+        # Samplers are kept with the index and entries they were built over
+        self._sampler_entries: Tuple[Optional[StyleIndex], SamplerEntries] = (None, ([], array('I'), array('I')))
+        self._samplers: Dict[str, Tuple[StyleIndex, SamplerEntries, AliasSampler]] = {}
+        self._stale_samplers: Set[str] = set()
+        self._samplers_rebuilding: Set[str] = set()
+        self._sampler_usage_changes = 0
+        self._recent_random: deque = deque(maxlen=RANDOM_HISTORY_SIZE)
+        # Guards the cache, catalog and index; searches may run off the Tk thread
+        self._lock = threading.RLock()
+        # Held while the style index is built, so concurrent callers wait for one build
+        self._index_build_lock = threading.Lock()
+        self._index_rebuilding = False
         self._load_metadata()
+        self._load_catalog()
+        self.refresh_catalog()
     
     def get_categories(self) -> List[str]:
         """Get list of available style categories."""
@@ -49,59 +249,425 @@ class StyleManager:
     
     def get_styles_for_category(self, category: str) -> List[str]:
         """Get styles for a specific category with caching."""
-        if category in self._style_cache:
-            return self._style_cache[category]
+        with self._lock:
+            styles = self._style_cache.get(category)
+            if styles is not None:
+                return styles
+            
+            file_path = os.path.join(self.styles_folder, f"{category}.txt")
+            signature = self._file_signature(file_path)
+            if signature is None:
+                self.logger.warning(f"Style file not found: {file_path}")
+                return []
+            
+            styles = self._read_style_file(file_path)
+            if styles is None:
+                return []
+            
+            entry = self._catalog.get(category)
+            if entry and (entry["size"], entry["mtime"]) == signature:
+                self._style_cache.put(category, styles)
+            else:
+                self._update_catalog_entry(category, signature, styles)
+                self._save_catalog()
+            return styles
+    
+    def get_cache_stats(self) -> Dict[str, int]:
+        """Get style cache size and hit/miss counters."""
+        return self._style_cache.stats()
+    
+    def refresh_catalog(self) -> Tuple[List[str], List[str], List[str]]:
+        """Sync the compiled catalog with the Styles folder.
         
-        file_path = os.path.join(self.styles_folder, f"{category}.txt")
-        if not os.path.exists(file_path):
-            self.logger.warning(f"Style file not found: {file_path}")
+        Only categories whose file size or mtime changed are re-parsed; the
+        catalog file is rewritten once if anything changed. Returns the
+        (added, changed, removed) categories.
+        """
+        with self._lock:
+            categories = self.get_categories()
+            added, changed = [], []
+            
+            for category in categories:
+                file_path = os.path.join(self.styles_folder, f"{category}.txt")
+                signature = self._file_signature(file_path)
+                if signature is None:
+                    continue
+                
+                entry = self._catalog.get(category)
+                if entry and (entry["size"], entry["mtime"]) == signature:
+                    continue
+                
+                styles = self._read_style_file(file_path)
+                if styles is not None:
+                    self._update_catalog_entry(category, signature, styles)
+                    (changed if entry else added).append(category)
+            
+            removed = [c for c in self._catalog if c not in categories]
+            for category in removed:
+                del self._catalog[category]
+                self._style_cache.pop(category)
+                self._invalidate_index()
+            
+            self._refresh_tags()
+            
+            if added or changed or removed:
+                self._save_catalog()
+                self.logger.info(f"Style catalog updated: {len(added)} added, "
+                                 f"{len(changed)} changed, {len(removed)} removed")
+            return added, changed, removed
+    
+    def search_styles(self, search_term: str, categories: Optional[List[str]] = None,
+                      limit: Optional[int] = DEFAULT_SEARCH_LIMIT) -> List[str]:
+        """Search for styles across categories with typo-tolerant matching.
+        
+        Substring matches come first, followed by close spellings; at most
+        limit results are returned (all of them when limit is None).
+        """
+        if not search_term.strip():
             return []
         
-        try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                styles = [line.strip() for line in file if line.strip()]
-            
-            self._style_cache[category] = styles
-            return styles
-        except (IOError, UnicodeDecodeError) as e:
-            self.logger.error(f"Error reading style file {file_path}: {e}")
+        results = self._get_index().fuzzy_search(search_term, categories, limit)
+        return [style for style, _ in results]
+    
+    def get_completions(self, prefix: str, limit: int = DEFAULT_COMPLETION_LIMIT) -> List[str]:
+        """Get styles from any category whose name or a word of it starts with prefix.
+        
+        The most used styles come first. This never builds an index on the
+        calling thread: until the background build finishes there are no
+        completions, and re-ranking by usage shows up after the next rebuild.
+        """
+        if not prefix.strip():
             return []
+        prefix_index = self._get_prefix_index()
+        return prefix_index.complete(prefix, limit) if prefix_index else []
     
-    def search_styles(self, search_term: str, categories: Optional[List[str]] = None) -> List[str]:
-        """Search for styles across categories with fuzzy matching."""
-        if not search_term.strip():
+    def get_similar_styles(self, style: str, limit: int = DEFAULT_SIMILAR_LIMIT) -> List[str]:
+        """Get the styles most similar to style across every category.
+        
+        Similarity is the cosine of character trigram TF-IDF vectors; returns
+        an empty list when numpy is not installed.
+        """
+        if not SIMILARITY_AVAILABLE or not style.strip():
             return []
+        return [name for name, _ in self._get_similarity().similar(style, limit)]
+    
+    def get_random_style(self, weighting: str = "size",
+                         avoid_recent: int = 20) -> Optional[Tuple[str, str, int]]:
+        """Pick a random style from the whole catalog.
+        
+        Every (style, category) entry is weighted by one of RANDOM_WEIGHTINGS:
+        "size" (uniform over entries, so categories count by their size),
+        "usage" (1 + lifetime uses) or "favorites" (favorites FAVORITE_WEIGHT
+        times likelier). Styles among the last avoid_recent picks are
+        redrawn. Returns (style, category, position in category), or None
+        while the first sampler is still being built.
+        """
+        with self._lock:
+            built = self._get_sampler(weighting)
+            if built is None:
+                return None
+            
+            _, (categories, entry_categories, entry_positions), sampler = built
+            recent = list(self._recent_random)[-avoid_recent:] if avoid_recent > 0 else []
+            choice = None
+            for _ in range(RANDOM_MAX_ATTEMPTS):
+                entry = sampler.sample()
+                category = categories[entry_categories[entry]]
+                position = entry_positions[entry]
+                styles = self.get_styles_for_category(category)
+                if position >= len(styles):
+                    continue
+                choice = (styles[position], category, position)
+                if choice[0] not in recent:
+                    break
+            
+            if choice:
+                self._recent_random.append(choice[0])
+            return choice
+    
+    def _get_sampler(self, weighting: str) -> Optional[Tuple[StyleIndex, SamplerEntries, AliasSampler]]:
+        """Get the alias sampler for a weighting as built so far, or None.
+        
+        Call with the lock held. A missing or stale sampler is rebuilt on a
+        background thread; the current one keeps being served meanwhile.
+        """
+        if weighting not in RANDOM_WEIGHTINGS:
+            raise ValueError(f"Unknown random weighting: {weighting}")
+        
+        built = self._samplers.get(weighting)
+        stale = (built is None or built[0] is not self._index
+                 or weighting in self._stale_samplers
+                 or (weighting == "usage" and self._sampler_usage_changes >= SAMPLER_USAGE_REBUILD))
+        if stale and weighting not in self._samplers_rebuilding:
+            self._samplers_rebuilding.add(weighting)
+            threading.Thread(target=self._rebuild_sampler, args=(weighting,),
+                             name="mat-sampler", daemon=True).start()
+        return built
+    
+    def _rebuild_sampler(self, weighting: str) -> None:
+        """Build the alias sampler for a weighting (and the style index it needs) off the Tk thread."""
+        try:
+            self._build_sampler(weighting)
+        except Exception as e:
+            self.logger.error(f"Error building random style sampler: {e}")
+        finally:
+            with self._lock:
+                self._samplers_rebuilding.discard(weighting)
+    
+    def _build_sampler(self, weighting: str) -> None:
+        """Build the alias sampler for a weighting over the current index."""
+        index = self._get_index()
+        with self._lock:
+            version = self._catalog_version
+            entries_index, entries = self._sampler_entries
+            usage = dict(self._usage_stats) if weighting == "usage" else {}
+            favorites = set(self._favorites)
+            self._stale_samplers.discard(weighting)
+            if weighting == "usage":
+                self._sampler_usage_changes = 0
         
-        search_term = search_term.lower()
-        results = set()
+        styles_by_category = []
+        if entries_index is not index or weighting != "size":
+            styles_by_category = [self.get_styles_for_category(category) for category in index.categories]
+        if entries_index is not index:
+            entry_categories, entry_positions = array('I'), array('I')
+            for category_id, styles in enumerate(styles_by_category):
+                entry_categories.extend([category_id] * len(styles))
+                entry_positions.extend(range(len(styles)))
+            entries = (index.categories, entry_categories, entry_positions)
+        if not entries[1]:
+            return
         
-        # Determine which categories to search
-        search_categories = categories or self.get_categories()
+        if weighting == "size":
+            weights = [1.0] * len(entries[1])
+        elif weighting == "usage":
+            weights = [1.0 + usage.get(style, 0) for styles in styles_by_category for style in styles]
+        else:
+            weights = [FAVORITE_WEIGHT if style in favorites else 1.0
+                       for styles in styles_by_category for style in styles]
+        sampler = AliasSampler(weights)
         
-        for category in search_categories:
-            styles = self.get_styles_for_category(category)
-            for style in styles:
-                if search_term in style.lower():
-                    results.add(style)
+        with self._lock:
+            if self._catalog_version == version:
+                self._sampler_entries = (index, entries)
+                self._samplers[weighting] = (index, entries, sampler)
+    
+    def get_style_item(self, style: str, category: str) -> StyleItem:
+        """Get a style with its favorite flag, usage count and tags."""
+        return StyleItem(style, category, self.is_favorite(style),
+                         self.get_usage_count(style), self.get_tags(style))
+    
+    def get_tags(self, style: str, category: Optional[str] = None) -> List[str]:
+        """Get the tags given to a style in one category's tag file, or in any of them."""
+        if category is not None:
+            return list(self._tags.get(category, {}).get(style, []))
+        return list(self._get_tag_index().tags_for(style))
+    
+    def get_all_tags(self) -> List[Tuple[str, int]]:
+        """Get every (tag, style count) pair, including one tag per category."""
+        return self._get_tag_index().tags()
+    
+    def set_tags(self, style: str, category: str, tags: List[str]) -> None:
+        """Replace a style's tags in a category's tag file."""
+        tags = sorted({normalize_tag(tag) for tag in tags if normalize_tag(tag)})
+        with self._lock:
+            category_tags = self._tags.setdefault(category, {})
+            if tags:
+                category_tags[style] = tags
+            else:
+                category_tags.pop(style, None)
+            self._save_tag_file(category)
+            self._tag_index = None
+    
+    def filter_styles(self, expression: str, categories: Optional[List[str]] = None,
+                      limit: Optional[int] = None) -> List[str]:
+        """Get the styles matching a boolean tag expression, ranked.
         
-        # Sort by relevance (exact matches first, then partial matches)
-        sorted_results = sorted(results, key=lambda x: (
-            search_term not in x.lower(),  # Exact matches first
-            len(x),  # Shorter matches first
-            x.lower()  # Alphabetical
-        ))
+        Expressions combine tags with AND, OR, NOT and parentheses, e.g.
+        "portraits AND dark AND NOT erotic". Raises ValueError if the
+        expression is malformed.
+        """
+        if not expression.strip():
+            return []
+        results = self._get_tag_index().query(expression, categories)
+        return results if limit is None else results[:limit]
+    
+    def get_categories_for_style(self, style: str, wait: bool = True) -> List[str]:
+        """Get the categories that list a style.
         
-        return sorted_results
+        With wait=False this never blocks on the style index: until it is
+        built (in the background) the list is empty.
+        """
+        if not wait:
+            index = self._get_built_index()
+            return index.categories_for(style) if index is not None else []
+        return self._get_index().categories_for(style)
+    
+    def _get_index(self) -> StyleIndex:
+        """Get the catalog-wide style index, building it if needed.
+        
+        The index is built outside the lock so the UI thread can keep reading
+        categories meanwhile; it is only kept if the catalog did not change.
+        Never call this while holding the lock: a build in progress holds
+        the build lock and needs the lock to finish.
+        """
+        with self._lock:
+            if self._index is not None:
+                return self._index
+        
+        with self._index_build_lock:
+            with self._lock:
+                if self._index is not None:
+                    return self._index
+                version = self._catalog_version
+                styles_by_category = {
+                    category: self.get_styles_for_category(category)
+                    for category in self.get_categories()
+                }
+            
+            index = StyleIndex(styles_by_category)
+            with self._lock:
+                if self._index is None and self._catalog_version == version:
+                    self._index = index
+                    self.logger.info(f"Style index built with {len(index)} styles")
+                return self._index or index
+    
+    def _get_built_index(self) -> Optional[StyleIndex]:
+        """Get the style index if it is built, or None while it is built in the background."""
+        with self._lock:
+            if self._index is None and not self._index_rebuilding:
+                self._index_rebuilding = True
+                threading.Thread(target=self._rebuild_index, name="mat-index", daemon=True).start()
+            return self._index
+    
+    def _rebuild_index(self) -> None:
+        """Build the style index off the Tk thread."""
+        try:
+            self._get_index()
+        except Exception as e:
+            self.logger.error(f"Error building style index: {e}")
+        finally:
+            with self._lock:
+                self._index_rebuilding = False
+    
+    def _get_similarity(self) -> StyleSimilarity:
+        """Get the style similarity vectors, loading or building them if needed."""
+        with self._lock:
+            if self._similarity is not None:
+                return self._similarity
+            version = self._catalog_version
+        
+        index = self._get_index()
+        similarity = load_or_build(os.path.join(self.styles_folder, SIMILARITY_FILENAME), index.names)
+        with self._lock:
+            if self._similarity is None and self._catalog_version == version:
+                self._similarity = similarity
+                self.logger.info(f"Style similarity ready for {len(similarity)} styles")
+            return self._similarity or similarity
+    
+    def _get_tag_index(self) -> TagIndex:
+        """Get the tag bitsets, building them if needed."""
+        index = self._get_index()
+        with self._lock:
+            if self._tag_index is None or self._tag_index._style_index is not index:
+                self._tag_index = TagIndex(index, self._tags)
+            return self._tag_index
+    
+    def _get_prefix_index(self) -> Optional[PrefixIndex]:
+        """Get the completion index as built so far, or None.
+        
+        A missing index, or one that usage has shifted enough, is rebuilt on
+        a background thread; the current one keeps being served meanwhile.
+        """
+        with self._lock:
+            prefix_index = self._prefix_index
+            stale = (prefix_index is None or self._index is None
+                     or prefix_index.names is not self._index.names
+                     or self._prefix_usage_changes >= PREFIX_USAGE_REBUILD)
+            if stale and not self._prefix_rebuilding:
+                self._prefix_rebuilding = True
+                threading.Thread(target=self._rebuild_prefix_index, name="mat-completions",
+                                 daemon=True).start()
+            return prefix_index
+    
+    def _rebuild_prefix_index(self) -> None:
+        """Build the completion index (and the style index it needs) off the Tk thread."""
+        try:
+            index = self._get_index()
+            with self._lock:
+                version = self._catalog_version
+                scores = [self._usage_stats.get(name, 0) for name in index.names]
+                self._prefix_usage_changes = 0
+            
+            prefix_index = PrefixIndex(index.names, scores)
+            with self._lock:
+                if self._catalog_version == version:
+                    self._prefix_index = prefix_index
+        except Exception as e:
+            self.logger.error(f"Error building completion index: {e}")
+        finally:
+            with self._lock:
+                self._prefix_rebuilding = False
+    
+    def _invalidate_index(self) -> None:
+        """Drop the style index, tag bitsets and similarity vectors after the catalog changed."""
+        self._index = None
+        self._tag_index = None
+        self._prefix_index = None
+        self._similarity = None
+        self._catalog_version += 1
+    
+    def get_prefetch_order(self, first: Optional[str] = None) -> List[str]:
+        """Get categories in warm-up order: first, then the most used ones."""
+        categories = sorted(self.get_categories(),
+                            key=lambda x: (-self._category_usage.get(x, 0), x))
+        if first in categories:
+            categories.remove(first)
+            categories.insert(0, first)
+        return categories
+    
+    def prefetch(self, categories: List[str], progress: Optional[Callable[[int, int], None]] = None,
+                 cancel_event: Optional[threading.Event] = None,
+                 random_weighting: Optional[str] = None) -> None:
+        """Load categories into the cache, then build the search index.
+        
+        Meant to run on a worker thread. progress, if given, is called with
+        (done, total) after each step. random_weighting, if given, also
+        starts building the sampler get_random_style will use.
+        """
+        total = len(categories) + 1
+        for done, category in enumerate(categories, 1):
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            self.get_styles_for_category(category)
+            if progress:
+                progress(done, total)
+        
+        if cancel_event is not None and cancel_event.is_set():
+            return
+        self._get_index()
+        self._get_prefix_index()  # starts the completion index build if needed
+        if random_weighting in RANDOM_WEIGHTINGS:
+            with self._lock:
+                self._get_sampler(random_weighting)  # likewise for the random sampler
+        if SIMILARITY_AVAILABLE:
+            self._get_similarity()
+        if progress:
+            progress(total, total)
     
     def add_favorite(self, style: str) -> None:
         """Add a style to favorites."""
         self._favorites.add(style)
-        self._save_metadata()
+        self._stale_samplers.add("favorites")
+        self._metadata_dirty = True
+        self._mark_metadata_changed()
     
     def remove_favorite(self, style: str) -> None:
         """Remove a style from favorites."""
         self._favorites.discard(style)
-        self._save_metadata()
+        self._stale_samplers.add("favorites")
+        self._metadata_dirty = True
+        self._mark_metadata_changed()
     
     def get_favorites(self) -> List[str]:
         """Get list of favorite styles."""
@@ -111,50 +677,328 @@ class StyleManager:
         """Check if a style is marked as favorite."""
         return style in self._favorites
     
-    def increment_usage(self, style: str) -> None:
-        """Increment usage count for a style."""
-        self._usage_stats[style] = self._usage_stats.get(style, 0) + 1
-        self._save_metadata()
+    def increment_usage(self, style: str, category: Optional[str] = None) -> None:
+        """Record a use of a style, picked from category if known, in the usage log."""
+        if category not in self._catalog:
+            category = None
+        now = max(time.time(), self._last_usage_time)
+        self._apply_usage_event(style, category, now)
+        self._pending_usage_events.append((style, category, now))
+        self._mark_metadata_changed()
+    
+    @contextmanager
+    def batch_updates(self):
+        """Defer metadata writes until the end of a block of updates."""
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self.flush_metadata()
+    
+    def flush_metadata(self) -> None:
+        """Write pending favorites and usage changes to disk.
+        
+        Usage events are appended to the usage log; the log is compacted
+        into _metadata.json when it grows past a threshold or when the
+        metadata has to be rewritten anyway.
+        """
+        pending_events = len(self._pending_usage_events)
+        if self._metadata_dirty or self._usage_log_events + pending_events >= USAGE_LOG_COMPACT_THRESHOLD:
+            self.compact_usage_log()
+        elif pending_events:
+            self._append_usage_events()
+        self._pending_metadata_changes = 0
+    
+    def compact_usage_log(self) -> None:
+        """Fold every logged usage event into _metadata.json and empty the log.
+        
+        The log is only emptied once the metadata is safely written.
+        """
+        self._popularity.rebase(time.time())
+        if not self._save_metadata():
+            # Keep the log, plus the events not logged yet, for the next attempt
+            if self._pending_usage_events:
+                self._append_usage_events()
+            return
+        self._pending_usage_events.clear()
+        self._metadata_dirty = False
+        
+        try:
+            with open(self._usage_log_path, 'w', encoding='utf-8'):
+                pass
+            self._usage_log_events = 0
+            self._usage_log_torn = False
+        except IOError as e:
+            self.logger.error(f"Error truncating usage log: {e}")
+    
+    def _mark_metadata_changed(self) -> None:
+        """Record a metadata change, writing once enough have accumulated.
+        
+        Changes are written behind: callers flush on a timer and on exit.
+        """
+        self._pending_metadata_changes += 1
+        if self._batch_depth == 0 and self._pending_metadata_changes >= METADATA_FLUSH_THRESHOLD:
+            self.flush_metadata()
     
     def get_popular_styles(self, limit: int = 10) -> List[str]:
-        """Get most popular styles based on usage."""
-        sorted_styles = sorted(
-            self._usage_stats.items(),
-            key=lambda x: x[1],
-            reverse=True
-        )
-        return [style for style, _ in sorted_styles[:limit]]
+        """Get the most popular styles, weighting recent uses more heavily.
+        
+        Each use loses half its weight every USAGE_HALF_LIFE seconds, so this
+        reflects what is trending rather than lifetime totals.
+        """
+        return self._popularity.top(limit)
     
-    def _load_metadata(self) -> None:
-        """Load style metadata (favorites, usage stats)."""
-        metadata_path = os.path.join(self.styles_folder, "_metadata.json")
-        if not os.path.exists(metadata_path):
+    def get_usage_count(self, style: str) -> int:
+        """Get the lifetime number of uses of a style."""
+        return self._usage_stats.get(style, 0)
+    
+    def _apply_usage_event(self, style: str, category: Optional[str], timestamp: float) -> None:
+        """Apply one usage event to the in-memory counters."""
+        self._usage_stats[style] = self._usage_stats.get(style, 0) + 1
+        if category:
+            self._category_usage[category] = self._category_usage.get(category, 0) + 1
+        self._popularity.record(style, timestamp)
+        self._sampler_usage_changes += 1
+        self._prefix_usage_changes += 1
+        self._last_usage_time = max(self._last_usage_time, timestamp)
+    
+    def _append_usage_events(self) -> None:
+        """Append pending usage events to the usage log."""
+        try:
+            with open(self._usage_log_path, 'a', encoding='utf-8') as file:
+                if self._usage_log_torn:
+                    file.write("\n")  # keep the torn line from swallowing the next event
+                    self._usage_log_torn = False
+                for style, category, timestamp in self._pending_usage_events:
+                    event = {"style": style, "ts": timestamp}
+                    if category:
+                        event["category"] = category
+                    file.write(json.dumps(event, ensure_ascii=False) + "\n")
+            sync_later(self._usage_log_path)
+            self._usage_log_events += len(self._pending_usage_events)
+            self._pending_usage_events.clear()
+        except IOError as e:
+            self.logger.error(f"Error appending to usage log: {e}")
+    
+    def _replay_usage_log(self, compacted_until: float) -> None:
+        """Apply usage events logged since the last compaction."""
+        if not os.path.exists(self._usage_log_path):
             return
         
         try:
-            with open(metadata_path, 'r', encoding='utf-8') as file:
-                metadata = json.load(file)
-            
-            self._favorites = set(metadata.get("favorites", []))
-            self._usage_stats = metadata.get("usage_stats", {})
-        except (IOError, json.JSONDecodeError) as e:
-            self.logger.error(f"Error loading style metadata: {e}")
+            with open(self._usage_log_path, 'r', encoding='utf-8') as file:
+                for line in file:
+                    self._usage_log_torn = not line.endswith("\n")
+                    try:
+                        event = json.loads(line)
+                        style, timestamp = event["style"], float(event["ts"])
+                    except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+                        continue  # torn write from a crash
+                    self._usage_log_events += 1
+                    if timestamp > compacted_until:
+                        self._apply_usage_event(style, event.get("category"), timestamp)
+        except (IOError, UnicodeDecodeError) as e:
+            self.logger.error(f"Error reading usage log: {e}")
+    
+    def _load_metadata(self) -> None:
+        """Load style metadata (favorites, usage stats) and replay the usage log."""
+        metadata_path = os.path.join(self.styles_folder, "_metadata.json")
+        compacted_until = 0.0
+        
+        metadata = load_with_backup(metadata_path, json.loads)
+        if metadata is not None:
+            try:
+                self._favorites = set(metadata.get("favorites", []))
+                self._usage_stats = metadata.get("usage_stats", {})
+                self._category_usage = metadata.get("category_usage", {})
+                compacted_until = metadata.get("usage_log_compacted_until", 0.0)
+                
+                decayed = metadata.get("decayed_usage")
+                if decayed:
+                    self._popularity = PopularityTracker(decayed["reference_time"], decayed["scores"])
+                else:
+                    # Older metadata only has lifetime counts; start their decay now
+                    self._popularity = PopularityTracker(time.time(), self._usage_stats)
+            except (AttributeError, KeyError, TypeError) as e:
+                self.logger.error(f"Error loading style metadata: {e}")
+        
+        self._last_usage_time = compacted_until
+        self._replay_usage_log(compacted_until)
+        self._popularity.rebase(time.time())
     
-    def _save_metadata(self) -> None:
-        """Save style metadata (favorites, usage stats)."""
+    def _save_metadata(self) -> bool:
+        """Save style metadata (favorites, usage stats, decayed scores); False if it failed."""
         metadata_path = os.path.join(self.styles_folder, "_metadata.json")
         metadata = {
             "favorites": list(self._favorites),
-            "usage_stats": self._usage_stats
+            "usage_stats": self._usage_stats,
+            "category_usage": self._category_usage,
+            "decayed_usage": {
+                "reference_time": self._popularity.reference_time,
+                "scores": self._popularity.scores
+            },
+            "usage_log_compacted_until": self._last_usage_time
         }
         
         try:
-            with open(metadata_path, 'w', encoding='utf-8') as file:
-                json.dump(metadata, file, indent=2)
-        except IOError as e:
+            atomic_write(metadata_path, json.dumps(metadata, indent=2))
+            return True
+        except (IOError, OSError) as e:
             self.logger.error(f"Error saving style metadata: {e}")
+            return False
+    
+    def _file_signature(self, file_path: str) -> Optional[Tuple[int, int]]:
+        """Return (size, mtime_ns) for a style file, or None if it is missing."""
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+    
+    def _read_style_file(self, file_path: str) -> Optional[List[str]]:
+        """Parse a style file into a list of non-empty, interned lines.
+        
+        Interning shares one string object between every category that
+        lists the same style.
+        """
+        try:
+            with open(file_path, 'r', encoding='utf-8') as file:
+                return [sys.intern(line.strip()) for line in file if line.strip()]
+        except (IOError, UnicodeDecodeError) as e:
+            self.logger.error(f"Error reading style file {file_path}: {e}")
+            return None
+    
+    def _update_catalog_entry(self, category: str, signature: Tuple[int, int],
+                              styles: List[str]) -> None:
+        """Record a category's file signature and cache its freshly parsed styles."""
+        size, mtime = signature
+        self._catalog[category] = {"size": size, "mtime": mtime}
+        self._style_cache.put(category, styles)
+        self._invalidate_index()
+    
+    def _refresh_tags(self) -> None:
+        """Reload tag files that were added, edited or deleted."""
+        try:
+            filenames = [f for f in os.listdir(self.styles_folder) if f.endswith(TAGS_EXTENSION)]
+        except OSError as e:
+            self.logger.error(f"Error reading styles folder: {e}")
+            return
+        
+        categories = set()
+        for filename in filenames:
+            category = filename[:-len(TAGS_EXTENSION)]
+            categories.add(category)
+            signature = self._file_signature(os.path.join(self.styles_folder, filename))
+            if signature is None or self._tag_signatures.get(category) == signature:
+                continue
+            self._tags[category] = self._read_tag_file(category)
+            self._tag_signatures[category] = signature
+            self._tag_index = None
+        
+        for category in [c for c in self._tag_signatures if c not in categories]:
+            del self._tag_signatures[category]
+            self._tags.pop(category, None)
+            self._tag_index = None
+    
+    def _read_tag_file(self, category: str) -> Dict[str, List[str]]:
+        """Parse a tag file; each line is "style | tag, tag, ..."."""
+        file_path = os.path.join(self.styles_folder, f"{category}{TAGS_EXTENSION}")
+        tags: Dict[str, List[str]] = {}
+        try:
+            with open(file_path, 'r', encoding='utf-8') as file:
+                for line in file:
+                    style, separator, tag_list = line.rpartition("|")
+                    style = style.strip()
+                    if not separator or not style or style.startswith("#"):
+                        continue
+                    style_tags = {normalize_tag(tag) for tag in tag_list.split(",")}
+                    style_tags.discard("")
+                    if style_tags:
+                        tags[sys.intern(style)] = sorted(style_tags)
+        except (IOError, UnicodeDecodeError) as e:
+            self.logger.error(f"Error reading tag file {file_path}: {e}")
+        return tags
+    
+    def _save_tag_file(self, category: str) -> None:
+        """Write a category's tag file, or delete it once no style has tags."""
+        file_path = os.path.join(self.styles_folder, f"{category}{TAGS_EXTENSION}")
+        tags = self._tags.get(category)
+        
+        try:
+            if not tags:
+                self._tags.pop(category, None)
+                self._tag_signatures.pop(category, None)
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+                return
+            
+            lines = [f"{style} | {', '.join(tags[style])}\n" for style in sorted(tags, key=str.lower)]
+            atomic_write(file_path, "".join(lines))
+            self._tag_signatures[category] = self._file_signature(file_path)
+        except (IOError, OSError) as e:
+            self.logger.error(f"Error saving tag file {file_path}: {e}")
+    
+    def _load_catalog(self) -> None:
+        """Load the compiled style catalog in a single read.
+        
+        Signatures are kept for every category; the styles themselves go
+        into the LRU cache, which may keep only the most recent ones.
+        """
+        if not os.path.exists(self._catalog_path):
+            return
+        
+        try:
+            with open(self._catalog_path, 'r', encoding='utf-8') as file:
+                catalog = json.load(file)
+            
+            if catalog.get("version") != CATALOG_VERSION:
+                self.logger.info("Style catalog version changed, rebuilding")
+                return
+            
+            for category, entry in catalog.get("categories", {}).items():
+                self._catalog[category] = {"size": entry["size"], "mtime": entry["mtime"]}
+                self._style_cache.put(category, [sys.intern(style) for style in entry["styles"]])
+        except (IOError, json.JSONDecodeError, AttributeError, KeyError, TypeError) as e:
+            self.logger.error(f"Error loading style catalog: {e}")
+            self._catalog = {}
+            self._style_cache.clear()
+    
+    def _save_catalog(self) -> None:
+        """Write the compiled style catalog.
+        
+        Categories are written one at a time; those evicted from the cache
+        are re-read from their style file, so saving never needs the whole
+        catalog in memory.
+        """
+        temp_path = self._catalog_path + ".tmp"
+        
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                file.write(f'{{"version":{CATALOG_VERSION},"categories":{{')
+                for position, (category, entry) in enumerate(self._catalog.items()):
+                    styles = self._style_cache.peek(category)
+                    if styles is None:
+                        file_path = os.path.join(self.styles_folder, f"{category}.txt")
+                        styles = self._read_style_file(file_path) or []
+                    
+                    record = {"size": entry["size"], "mtime": entry["mtime"], "styles": styles}
+                    if position:
+                        file.write(',')
+                    file.write(json.dumps(category, ensure_ascii=False) + ':')
+                    file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+                file.write('}}')
+            os.replace(temp_path, self._catalog_path)
+        except (IOError, OSError) as e:
+            self.logger.error(f"Error saving style catalog: {e}")
     
     def clear_cache(self) -> None:
-        """Clear the style cache."""
-        self._style_cache.clear()
-        self.logger.info("Style cache cleared")
+        """Clear the style cache.
+        
+        Category signatures are kept; styles are re-read from their files
+        on next access.
+        """
+        with self._lock:
+            self._style_cache.clear()
+            self.logger.info("Style cache cleared")
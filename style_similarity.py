@@ -0,0 +1,156 @@
+"""Character n-gram TF-IDF similarity between style names for MAT."""
+import os
+import hashlib
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; similarity is simply unavailable
+    np = None
+
+SIMILARITY_AVAILABLE = np is not None
+SIMILARITY_NGRAM_SIZE = 3
+
+def _style_ngrams(style: str) -> List[str]:
+    """Return the distinct padded character trigrams of a style name."""
+    text = f" {' '.join(style.lower().split())} "
+    return list(dict.fromkeys(text[i:i + SIMILARITY_NGRAM_SIZE]
+                              for i in range(len(text) - SIMILARITY_NGRAM_SIZE + 1)))
+
+def names_signature(names: Sequence[str]) -> str:
+    """Digest identifying a list of style names, used to validate the disk cache."""
+    digest = hashlib.sha1()
+    for name in names:
+        digest.update(name.encode('utf-8'))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+class StyleSimilarity:
+    """Nearest-neighbour lookup over L2-normalized TF-IDF trigram vectors.
+    
+    The vectors are stored column-wise (for every trigram, the styles that
+    contain it and their weights), so scoring a query against the whole
+    catalog only touches the postings of the query's own trigrams.
+    """
+    
+    def __init__(self, names: Sequence[str], grams: Sequence[str], idf, column_pointers,
+                 column_rows, column_weights):
+        if np is None:
+            raise RuntimeError("numpy is required for style similarity")
+        self.names: List[str] = list(names)
+        self._ids: Dict[str, int] = {name: i for i, name in enumerate(self.names)}
+        self._columns: Dict[str, int] = {gram: i for i, gram in enumerate(grams)}
+        self._grams = np.asarray(grams)
+        self._idf = idf
+        self._column_pointers = column_pointers
+        self._column_rows = column_rows
+        self._column_weights = column_weights
+        self._missing_idf = float(np.log(len(self.names) + 1.0) + 1.0)
+        self.signature = names_signature(self.names)
+    
+    @classmethod
+    def build(cls, names: Sequence[str]) -> "StyleSimilarity":
+        """Vectorize every style name."""
+        if np is None:
+            raise RuntimeError("numpy is required for style similarity")
+        
+        columns: Dict[str, int] = {}
+        rows: List[int] = []
+        cols: List[int] = []
+        for row, name in enumerate(names):
+            for gram in _style_ngrams(name):
+                rows.append(row)
+                cols.append(columns.setdefault(gram, len(columns)))
+        
+        rows = np.asarray(rows, dtype=np.int32)
+        cols = np.asarray(cols, dtype=np.int32)
+        document_frequency = np.bincount(cols, minlength=len(columns))
+        idf = (np.log((len(names) + 1.0) / (document_frequency + 1.0)) + 1.0).astype(np.float32)
+        
+        weights = idf[cols]
+        norms = np.sqrt(np.bincount(rows, weights=weights * weights, minlength=len(names)))
+        weights = (weights / norms[rows]).astype(np.float32)
+        
+        order = np.argsort(cols, kind='stable')
+        column_pointers = np.zeros(len(columns) + 1, dtype=np.int64)
+        np.cumsum(document_frequency, out=column_pointers[1:])
+        return cls(names, list(columns), idf, column_pointers, rows[order], weights[order])
+    
+    @classmethod
+    def load(cls, path: str, names: Sequence[str]) -> Optional["StyleSimilarity"]:
+        """Load cached vectors, or None if missing or built for other names."""
+        if np is None or not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            if str(data["signature"]) != names_signature(names):
+                return None
+            return cls(names, data["grams"].tolist(), data["idf"], data["column_pointers"],
+                       data["column_rows"], data["column_weights"])
+    
+    def save(self, path: str) -> None:
+        """Write the vectors to path via a temporary file."""
+        temp_path = path + ".tmp"
+        with open(temp_path, 'wb') as file:
+            np.savez(file, signature=np.asarray(self.signature), grams=self._grams,
+                     idf=self._idf, column_pointers=self._column_pointers,
+                     column_rows=self._column_rows, column_weights=self._column_weights)
+        os.replace(temp_path, path)
+    
+    def __len__(self) -> int:
+        return len(self.names)
+    
+    def similar(self, style: str, limit: int = 20) -> List[Tuple[str, float]]:
+        """Return up to limit (style, cosine similarity) pairs most like style.
+        
+        style itself is excluded; it does not have to be in the catalog.
+        """
+        columns, query_weights, missing = [], [], 0.0
+        for gram in _style_ngrams(style):
+            column = self._columns.get(gram)
+            if column is None:
+                missing += self._missing_idf ** 2
+            else:
+                columns.append(column)
+                query_weights.append(self._idf[column])
+        if not columns or limit <= 0:
+            return []
+        
+        query_weights = np.asarray(query_weights, dtype=np.float32)
+        query_weights /= np.sqrt(float(np.dot(query_weights, query_weights)) + missing)
+        
+        starts = self._column_pointers[columns]
+        ends = self._column_pointers[np.asarray(columns) + 1]
+        rows = np.concatenate([self._column_rows[s:e] for s, e in zip(starts, ends)])
+        weights = np.concatenate([self._column_weights[s:e] * w
+                                  for s, e, w in zip(starts, ends, query_weights)])
+        scores = np.bincount(rows, weights=weights, minlength=len(self.names))
+        
+        own_id = self._ids.get(style)
+        if own_id is not None:
+            scores[own_id] = 0.0
+        
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > limit:
+            top = np.argpartition(-scores[candidates], limit - 1)[:limit]
+            candidates = candidates[top]
+        # Ties keep the relevance order of the names list
+        ranked = sorted(candidates.tolist(), key=lambda i: (-scores[i], i))
+        return [(self.names[i], float(scores[i])) for i in ranked]
+
+def load_or_build(path: str, names: Sequence[str]) -> "StyleSimilarity":
+    """Load the cached vectors for names from path, rebuilding and saving them if stale."""
+    logger = logging.getLogger(__name__)
+    try:
+        similarity = StyleSimilarity.load(path, names)
+        if similarity is not None:
+            return similarity
+    except (IOError, ValueError, KeyError) as e:
+        logger.error(f"Error loading style similarity cache: {e}")
+    
+    similarity = StyleSimilarity.build(names)
+    try:
+        similarity.save(path)
+    except IOError as e:
+        logger.error(f"Error saving style similarity cache: {e}")
+    return similarity
@@ -0,0 +1,182 @@
+"""Tests for crash-safe file writing."""
+import os
+import sys
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from persistence import (BACKUP_SUFFIX, FsyncBatcher, PersistenceWorker, atomic_write,
+                         load_with_backup, sync_pending)
+
+class LoadWithBackupTest(unittest.TestCase):
+    """Falling back to the last good copy."""
+    
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        self.path = os.path.join(self.folder, "state.json")
+    
+    def write(self, path, text):
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(text)
+    
+    def read(self, path):
+        with open(path, 'r', encoding='utf-8') as file:
+            return file.read()
+    
+    def test_corrupt_file_is_recovered_from_backup(self):
+        self.write(self.path, '{"a": ')
+        self.write(self.path + BACKUP_SUFFIX, '{"a": 1}')
+        self.assertEqual(load_with_backup(self.path, json.loads), {"a": 1})
+        self.assertEqual(self.read(self.path), '{"a": 1}')  # restored for later writes
+    
+    def test_empty_file_is_corrupt_when_a_backup_exists(self):
+        self.write(self.path, "")
+        self.write(self.path + BACKUP_SUFFIX, "kept\n")
+        self.assertEqual(load_with_backup(self.path, str.splitlines), ["kept"])
+    
+    def test_empty_file_without_backup_is_parsed(self):
+        self.write(self.path, "")
+        self.assertEqual(load_with_backup(self.path, str.splitlines), [])
+    
+    def test_missing_files_give_none(self):
+        self.assertIsNone(load_with_backup(self.path, json.loads))
+    
+    def test_unusable_files_give_none(self):
+        self.write(self.path, "{")
+        self.write(self.path + BACKUP_SUFFIX, "[")
+        self.assertIsNone(load_with_backup(self.path, json.loads))
+
+class AtomicWriteTest(unittest.TestCase):
+    """Replacing files and keeping the last good copy."""
+    
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        self.path = os.path.join(self.folder, "state.json")
+    
+    def test_backup_keeps_the_last_synced_contents(self):
+        atomic_write(self.path, "first")
+        atomic_write(self.path, "second")  # first was never synced, so it is not kept
+        self.assertFalse(os.path.exists(self.path + BACKUP_SUFFIX))
+        
+        sync_pending()
+        atomic_write(self.path, "third")
+        with open(self.path + BACKUP_SUFFIX, 'r', encoding='utf-8') as file:
+            self.assertEqual(file.read(), "second")
+        with open(self.path, 'r', encoding='utf-8') as file:
+            self.assertEqual(file.read(), "third")
+        self.assertFalse(os.path.exists(self.path + ".tmp"))
+
+class FsyncBatcherTest(unittest.TestCase):
+    """Grouped fsyncs."""
+    
+    def test_only_synced_paths_are_cleared(self):
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        good, failing, missing = (os.path.join(folder, name) for name in ("good", "failing", "missing"))
+        for path in (good, failing):
+            open(path, 'w').close()
+        
+        batcher = FsyncBatcher(interval=60)
+        for path in (good, failing, missing):
+            batcher.mark_dirty(path)
+        real_open = os.open
+        
+        def open_or_fail(path, flags, *args):
+            if path == failing:
+                raise PermissionError(13, "denied")
+            return real_open(path, flags, *args)
+        
+        with mock.patch("persistence.os.open", side_effect=open_or_fail):
+            batcher.sync()
+        self.assertEqual([batcher.is_dirty(path) for path in (good, failing, missing)],
+                         [False, True, False])
+        self.assertIsNotNone(batcher._timer)  # the failed path is retried
+        
+        batcher.sync()
+        self.assertFalse(batcher.is_dirty(failing))
+        self.assertIsNone(batcher._timer)
+
+class PersistenceWorkerTest(unittest.TestCase):
+    """Background writes, coalesced per file."""
+    
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        self.worker = PersistenceWorker(name="test-writer")
+        self.addCleanup(self.worker.close, 5)
+        self.path = os.path.join(self.folder, "log.txt")
+        self.other = os.path.join(self.folder, "other.txt")
+    
+    def read(self, path):
+        with open(path, 'r', encoding='utf-8') as file:
+            return file.read()
+    
+    def block_worker(self):
+        """Occupy the worker thread until the returned event is set."""
+        started, release = threading.Event(), threading.Event()
+        
+        def render():
+            started.set()
+            release.wait(5)
+            return "blocker"
+        
+        self.worker.replace(os.path.join(self.folder, "blocker.txt"), render)
+        self.assertTrue(started.wait(5))
+        return release
+    
+    def test_writes_apply_in_order(self):
+        self.worker.append(self.path, "a")
+        self.worker.replace(self.path, lambda: "b")
+        self.worker.append(self.path, "c")
+        self.assertTrue(self.worker.flush(5))
+        self.assertEqual(self.read(self.path), "bc")
+    
+    def test_queued_appends_are_coalesced(self):
+        release = self.block_worker()
+        with mock.patch.object(PersistenceWorker, "_append_text",
+                               wraps=PersistenceWorker._append_text) as append_text:
+            for text in ("a", "b", "c"):
+                self.worker.append(self.path, text)
+            self.worker.append(self.other, "x")
+            release.set()
+            self.assertTrue(self.worker.flush(5))
+        self.assertEqual(append_text.call_count, 2)
+        self.assertEqual(self.read(self.path), "abc")
+        self.assertEqual(self.read(self.other), "x")
+    
+    def test_replace_drops_queued_writes_for_its_file(self):
+        with open(self.path, 'w', encoding='utf-8') as file:
+            file.write("old")
+        release = self.block_worker()
+        rendered = []
+        self.worker.replace(self.path, lambda: rendered.append(1) or "first")
+        self.worker.append(self.path, "lost")
+        self.worker.replace(self.path, lambda: "second")
+        self.worker.append(self.path, "!")
+        release.set()
+        self.assertTrue(self.worker.flush(5))
+        self.assertEqual(self.read(self.path), "second!")
+        self.assertEqual(rendered, [])  # superseded renders never run
+    
+    def test_writes_after_close_are_synchronous(self):
+        self.worker.close(5)
+        self.worker.append(self.path, "late")
+        self.assertEqual(self.read(self.path), "late")
+    
+    def test_failed_write_is_logged_and_later_writes_continue(self):
+        with self.assertLogs("persistence", level="ERROR"):
+            self.worker.replace(self.path, lambda: 1 / 0)
+            self.assertTrue(self.worker.flush(5))
+        self.worker.append(self.path, "ok")
+        self.assertTrue(self.worker.flush(5))
+        self.assertEqual(self.read(self.path), "ok")
+
+if __name__ == "__main__":
+    unittest.main()
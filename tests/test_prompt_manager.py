@@ -0,0 +1,201 @@
+"""Tests for PromptManager history storage."""
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from persistence import BACKUP_SUFFIX, sync_pending
+import prompt_manager
+from prompt_manager import HISTORY_FILENAME, LEGACY_HISTORY_FILENAME, PromptManager, PromptTemplate
+
+class PromptManagerTestCase(unittest.TestCase):
+    """A PromptManager on a fresh data folder."""
+    
+    backend = "json"
+    
+    def setUp(self):
+        self.data_folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_folder)
+        self.history_file = os.path.join(self.data_folder, HISTORY_FILENAME)
+    
+    def open_manager(self, **kwargs):
+        kwargs.setdefault("backend", self.backend)
+        manager = PromptManager(self.data_folder, **kwargs)
+        self.addCleanup(manager.close)
+        return manager
+    
+    def prompts(self, manager, search_term=""):
+        return [item.prompt for item in manager.search_history(search_term)]
+    
+    def log_lines(self):
+        with open(self.history_file, 'r', encoding='utf-8') as file:
+            return file.read().splitlines()
+
+class HistoryTest(PromptManagerTestCase):
+    """History behaviour shared by both storage backends."""
+    
+    def test_duplicates_are_counted_and_moved_to_the_top(self):
+        manager = self.open_manager()
+        for prompt in ("a cat", "a dog", "  A   Cat "):
+            manager.add_to_history(prompt)
+        self.assertEqual(self.prompts(manager), ["  A   Cat ", "a dog"])
+        self.assertEqual([item.hit_count for item in manager.get_history()], [2, 1])
+        self.assertEqual(manager.get_most_reused(1)[0].prompt, "  A   Cat ")
+    
+    def test_history_survives_a_restart(self):
+        manager = self.open_manager()
+        manager.add_to_history("a cat", "Cubism", {"ar": "16:9"})
+        manager.add_to_history("a cat")
+        manager.close()
+        
+        item, = self.open_manager().get_history()
+        self.assertEqual((item.prompt, item.hit_count), ("a cat", 2))
+    
+    def test_search_and_paging(self):
+        manager = self.open_manager()
+        for i in range(10):
+            manager.add_to_history(f"prompt {i}", "Cubism" if i % 2 else "")
+        self.assertEqual(manager.count_history("cubism"), 5)
+        self.assertEqual(self.prompts(manager, "cubism"), [f"prompt {i}" for i in (9, 7, 5, 3, 1)])
+        self.assertEqual(self.prompts(manager, "t 3"), ["prompt 3"])  # shorter than a trigram
+        self.assertEqual([item.prompt for item in manager.get_history(3, 2)],
+                         ["prompt 7", "prompt 6", "prompt 5"])
+    
+    def test_retention(self):
+        manager = self.open_manager(max_history=3)
+        for i in range(5):
+            manager.add_to_history(f"prompt {i}")
+        self.assertEqual(self.prompts(manager), ["prompt 4", "prompt 3", "prompt 2"])
+        manager.set_max_history(1)
+        self.assertEqual(self.prompts(manager), ["prompt 4"])
+    
+    def test_clear_history(self):
+        manager = self.open_manager()
+        manager.add_to_history("a cat")
+        self.assertTrue(manager.clear_history())
+        manager.close()
+        self.assertEqual(self.open_manager().count_history(), 0)
+    
+    def test_templates(self):
+        manager = self.open_manager()
+        manager.save_template(PromptTemplate("Portrait", "a portrait of {subject}", tags=["People"]))
+        manager.save_template(PromptTemplate("Landscape", "a wide {place}", description="scenery"))
+        manager.close()
+        
+        manager = self.open_manager()
+        self.assertEqual(manager.count_templates(), 2)
+        self.assertEqual([t.name for t in manager.get_templates_by_tag("people")], ["Portrait"])
+        self.assertEqual([t.name for t in manager.search_templates("scenery")], ["Landscape"])
+        self.assertTrue(manager.delete_template("Portrait"))
+        self.assertIsNone(manager.get_template("Portrait"))
+
+class SqliteHistoryTest(HistoryTest):
+    backend = "sqlite"
+
+class SqliteMigrationTest(PromptManagerTestCase):
+    """Opening the SQLite backend over existing JSON files."""
+    
+    def test_json_data_is_imported_once(self):
+        manager = self.open_manager(backend="json")
+        manager.add_to_history("first")
+        manager.add_to_history("second")
+        manager.save_template(PromptTemplate("Portrait", "a portrait"))
+        manager.close()
+        
+        manager = self.open_manager(backend="sqlite")
+        self.assertEqual(self.prompts(manager), ["second", "first"])
+        self.assertEqual(manager.count_templates(), 1)
+        manager.add_to_history("third")
+        manager.close()
+        
+        # The database is not re-imported from the JSON files
+        self.assertEqual(self.prompts(self.open_manager(backend="sqlite")), ["third", "second", "first"])
+    
+    def test_like_search_without_fts(self):
+        manager = self.open_manager(backend="sqlite")
+        manager._db.has_fts = False
+        manager.add_to_history("100% cotton")
+        manager.add_to_history("1000 cotton")
+        self.assertEqual(self.prompts(manager, "100%"), ["100% cotton"])  # % is not a wildcard
+
+class HistoryLogTest(PromptManagerTestCase):
+    """The JSON Lines history log."""
+    
+    def test_adds_are_appended(self):
+        manager = self.open_manager()
+        manager.add_to_history("a cat")
+        manager.add_to_history("a dog")
+        manager.add_to_history("a cat")
+        manager.flush()
+        self.assertEqual([json.loads(line)["prompt"] for line in self.log_lines()],
+                         ["a cat", "a dog", "a cat"])
+    
+    def test_log_is_compacted_once_enough_lines_are_stale(self):
+        with mock.patch.object(prompt_manager, "HISTORY_COMPACT_THRESHOLD", 5):
+            manager = self.open_manager(max_history=2)
+            for i in range(6):
+                manager.add_to_history(f"prompt {i}")
+            manager.flush()
+            self.assertEqual(len(self.log_lines()), 6)
+            manager.add_to_history("prompt 6")  # 7 lines for 2 items
+            manager.flush()
+        self.assertEqual([json.loads(line)["prompt"] for line in self.log_lines()],
+                         ["prompt 5", "prompt 6"])
+    
+    def test_torn_last_line_is_dropped_and_rewritten(self):
+        manager = self.open_manager()
+        manager.add_to_history("a cat")
+        manager.close()
+        with open(self.history_file, 'a', encoding='utf-8') as file:
+            file.write('{"prompt": "a d')
+        
+        manager = self.open_manager()
+        self.assertEqual(self.prompts(manager), ["a cat"])
+        manager.add_to_history("a dog")
+        manager.close()
+        self.assertEqual(self.prompts(self.open_manager()), ["a dog", "a cat"])
+    
+    def test_legacy_history_is_migrated(self):
+        legacy = [{"prompt": "newest", "timestamp": "2024-01-02T00:00:00"},
+                  {"prompt": "oldest", "timestamp": "2024-01-01T00:00:00"},
+                  {"prompt": "Newest ", "timestamp": "2023-12-31T00:00:00"}]
+        with open(os.path.join(self.data_folder, LEGACY_HISTORY_FILENAME), 'w', encoding='utf-8') as file:
+            json.dump(legacy, file)
+        
+        manager = self.open_manager()
+        self.assertEqual(self.prompts(manager), ["newest", "oldest"])
+        self.assertEqual(manager.get_history()[0].hit_count, 2)
+        self.assertTrue(os.path.exists(os.path.join(self.data_folder, LEGACY_HISTORY_FILENAME + ".migrated")))
+
+class HistoryRecoveryTest(PromptManagerTestCase):
+    """Reloading the history log after crashes."""
+    
+    def test_empty_log_is_recovered_from_backup(self):
+        manager = self.open_manager()
+        manager.add_to_history("first")
+        manager.add_to_history("second")
+        manager.close()
+        os.replace(self.history_file, self.history_file + BACKUP_SUFFIX)
+        open(self.history_file, 'w').close()  # renamed into place, never fsynced
+        
+        self.assertEqual(self.prompts(self.open_manager()), ["second", "first"])
+    
+    def test_cleared_history_stays_cleared(self):
+        manager = self.open_manager()
+        manager.add_to_history("first")
+        manager.close()
+        sync_pending()
+        manager = self.open_manager()
+        manager.clear_history()
+        manager.close()
+        self.assertTrue(os.path.exists(self.history_file + BACKUP_SUFFIX))
+        
+        self.assertEqual(self.prompts(self.open_manager()), [])
+
+if __name__ == "__main__":
+    unittest.main()
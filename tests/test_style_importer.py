@@ -0,0 +1,77 @@
+"""Tests for streaming style imports."""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import style_importer
+from style_importer import StyleImporter
+from style_manager import StyleManager
+
+class StyleImporterTest(unittest.TestCase):
+    """Importing text, CSV and JSON style lists."""
+    
+    def setUp(self):
+        self.styles_folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.styles_folder)
+        with open(os.path.join(self.styles_folder, "Abstract.txt"), 'w', encoding='utf-8') as file:
+            file.write("Cubism\n")
+        self.importer = StyleImporter(StyleManager(self.styles_folder))
+    
+    def import_text(self, name, text, **kwargs):
+        path = os.path.join(tempfile.mkdtemp(), name)
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(text)
+        return self.importer.import_file(path, **kwargs)
+    
+    def styles(self, category):
+        with open(os.path.join(self.styles_folder, f"{category}.txt"), 'r', encoding='utf-8') as file:
+            return file.read().splitlines()
+    
+    def test_text_import_appends_new_styles(self):
+        result = self.import_text("list.txt", "cubism\n  Fauvism \n\nFauvism\n", default_category="Abstract")
+        self.assertEqual(self.styles("Abstract"), ["Cubism", "Fauvism"])
+        self.assertEqual((result.lines_read, result.duplicates, result.added), (4, 2, {"Abstract": 1}))
+    
+    def test_csv_columns(self):
+        self.import_text("list.csv", "category,style\nNature,Forest\n,Desert\n")
+        self.assertEqual(self.styles("Nature"), ["Forest"])
+        self.assertEqual(self.styles("list"), ["Desert"])
+    
+    def test_json_array_and_object_forms(self):
+        self.import_text("a.json", '[{"style": "Forest", "category": "Nature"}, "Desert"]')
+        self.import_text("b.json", '{"Nature": ["Ocean", {"name": "River"}], "Abstract": "Dada"}')
+        self.assertEqual(self.styles("Nature"), ["Forest", "Ocean", "River"])
+        self.assertEqual(self.styles("a"), ["Desert"])
+        self.assertEqual(self.styles("Abstract"), ["Cubism", "Dada"])
+    
+    def test_json_is_streamed_across_chunks(self):
+        styles = [f"Style {i}" for i in range(200)]
+        text = "[" + ", ".join(f'"{style}"' for style in styles) + "]"
+        with mock.patch.object(style_importer, "CHUNK_SIZE", 7):
+            result = self.import_text("many.json", text)
+        self.assertEqual(result.total_added, 200)
+        self.assertEqual(self.styles("many"), styles)
+    
+    def test_non_string_values_are_invalid(self):
+        result = self.import_text("mixed.json", '["Forest", 1, null, ["Nested"], {"style": 2}, {}]')
+        self.assertEqual((result.total_added, result.invalid), (1, 5))
+        result = self.import_text("mixed.jsonl", '"Ocean"\n{not json\n3\n')
+        self.assertEqual((result.total_added, result.invalid), (1, 2))
+    
+    def test_malformed_json_is_rejected(self):
+        for text in ('[1 2]', '["a" "b"]', '["a",, "b"]', '["a",]', '[,"a"]',
+                     '{"Nature": ["a"] "Abstract": []}', '["a", "b"', '"a"'):
+            with self.subTest(text=text), self.assertRaises(ValueError):
+                self.import_text("bad.json", text)
+        self.assertFalse(os.path.exists(os.path.join(self.styles_folder, "bad.txt")))
+        self.assertEqual([f for f in os.listdir(self.styles_folder)
+                          if f.endswith(style_importer.TEMP_SUFFIX)], [])
+
+if __name__ == "__main__":
+    unittest.main()
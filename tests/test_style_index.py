@@ -0,0 +1,163 @@
+"""Tests for the catalog-wide style indexes."""
+import os
+import sys
+import random
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from style_index import AliasSampler, BKTree, PrefixIndex, StyleIndex, TagIndex, levenshtein
+
+def reference_distance(a, b):
+    """Textbook dynamic-programming edit distance."""
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+STYLES = {
+    "Abstract": ["Cubism", "Abstract Expressionism", "Art Nouveau"],
+    "Modern": ["Art Nouveau", "Art Deco", "Pop Art"],
+    "Nature": ["Forest", "Rain Forest"],
+}
+
+class LevenshteinTest(unittest.TestCase):
+    """Myers' bit-parallel edit distance."""
+    
+    def test_known_distances(self):
+        self.assertEqual(levenshtein("kitten", "sitting"), 3)
+        self.assertEqual(levenshtein("", "abc"), 3)
+        self.assertEqual(levenshtein("abc", ""), 3)
+        self.assertEqual(levenshtein("same", "same"), 0)
+    
+    def test_matches_the_reference_algorithm(self):
+        rng = random.Random(7)
+        for _ in range(500):
+            a = "".join(rng.choice("abcd") for _ in range(rng.randint(0, 12)))
+            b = "".join(rng.choice("abcd") for _ in range(rng.randint(0, 12)))
+            self.assertEqual(levenshtein(a, b), reference_distance(a, b), (a, b))
+
+class BKTreeTest(unittest.TestCase):
+    """Edit-distance bounded lookups."""
+    
+    def test_search_matches_brute_force(self):
+        rng = random.Random(11)
+        words = {"".join(rng.choice("abcde") for _ in range(rng.randint(1, 7))) for _ in range(300)}
+        tree = BKTree(words)
+        for query in ("abc", "eeee", "a", "dcbad"):
+            for max_distance in (0, 1, 2):
+                expected = sorted((reference_distance(query, word), word) for word in words
+                                  if reference_distance(query, word) <= max_distance)
+                self.assertEqual(sorted(tree.search(query, max_distance)), expected)
+    
+    def test_empty_tree(self):
+        self.assertEqual(BKTree().search("word", 2), [])
+
+class StyleIndexTest(unittest.TestCase):
+    """Ranked, typo-tolerant style search."""
+    
+    def setUp(self):
+        self.index = StyleIndex(STYLES)
+    
+    def test_unique_names_in_relevance_order(self):
+        self.assertEqual(len(self.index), 7)
+        self.assertEqual(self.index.names[:2], ["Cubism", "Forest"])
+    
+    def test_categories_for(self):
+        self.assertEqual(self.index.categories_for("Art Nouveau"), ["Abstract", "Modern"])
+        self.assertEqual(self.index.categories_for("Missing"), [])
+    
+    def test_substring_matches_rank_first(self):
+        results = self.index.fuzzy_search("forest")
+        self.assertEqual(results, [("Forest", 0), ("Rain Forest", 0)])
+    
+    def test_typos_and_prefixes(self):
+        self.assertEqual(self.index.fuzzy_search("nouveu"), [("Art Nouveau", 2)])
+        self.assertEqual(self.index.fuzzy_search("nuoveau"), [])  # a transposition is two edits
+        self.assertEqual(self.index.fuzzy_search("abstrct expr"), [("Abstract Expressionism", 2)])
+        self.assertEqual(self.index.fuzzy_search("zzz"), [])
+    
+    def test_category_filter_and_limit(self):
+        self.assertEqual([name for name, _ in self.index.fuzzy_search("art", ["Modern"])],
+                         ["Pop Art", "Art Deco", "Art Nouveau"])
+        self.assertEqual(len(self.index.fuzzy_search("art", limit=2)), 2)
+
+class AliasSamplerTest(unittest.TestCase):
+    """Weighted sampling."""
+    
+    def test_frequencies_follow_the_weights(self):
+        sampler = AliasSampler([1, 0, 3, 6])
+        rng = random.Random(3)
+        counts = [0] * 4
+        for _ in range(20000):
+            counts[sampler.sample(rng)] += 1
+        self.assertEqual(counts[1], 0)
+        for count, weight in zip(counts, [1, 0, 3, 6]):
+            self.assertAlmostEqual(count / 20000, weight / 10, delta=0.02)
+    
+    def test_rejects_no_positive_weight(self):
+        for weights in ([], [0, 0]):
+            with self.assertRaises(ValueError):
+                AliasSampler(weights)
+
+class PrefixIndexTest(unittest.TestCase):
+    """Usage-ranked completions."""
+    
+    def setUp(self):
+        self.names = StyleIndex(STYLES).names
+        self.scores = [0] * len(self.names)
+    
+    def complete(self, prefix, limit=10):
+        return PrefixIndex(self.names, self.scores).complete(prefix, limit)
+    
+    def test_matches_names_and_word_starts(self):
+        self.assertEqual(self.complete("nouv"), ["Art Nouveau"])
+        self.assertEqual(self.complete("FOR"), ["Forest", "Rain Forest"])
+        self.assertEqual(self.complete("x"), [])
+        self.assertEqual(self.complete(""), [])
+    
+    def test_usage_ranks_first(self):
+        self.scores[self.names.index("Art Nouveau")] = 5
+        self.assertEqual(self.complete("a"),
+                         ["Art Nouveau", "Pop Art", "Art Deco", "Abstract Expressionism"])
+        self.assertEqual(self.complete("a", limit=1), ["Art Nouveau"])
+        self.assertEqual(self.complete("art no"), ["Art Nouveau"])  # longer than the precomputed prefixes
+
+class TagIndexTest(unittest.TestCase):
+    """Boolean tag filters."""
+    
+    def setUp(self):
+        self.tags = TagIndex(StyleIndex(STYLES), {
+            "Abstract": {"Cubism": ["geometric", "paint"], "Art Nouveau": ["ornate"]},
+            "Modern": {"Art Deco": ["geometric", "ornate"], "Pop Art": ["vivid"]},
+        })
+    
+    def test_categories_are_tags(self):
+        self.assertEqual(self.tags.query("nature"), ["Forest", "Rain Forest"])
+    
+    def test_boolean_operators(self):
+        self.assertEqual(self.tags.query("geometric AND NOT paint"), ["Art Deco"])
+        self.assertEqual(self.tags.query("geometric ornate"), ["Art Deco"])  # implicit AND
+        self.assertEqual(self.tags.query("vivid OR paint"), ["Cubism", "Pop Art"])
+        self.assertEqual(self.tags.query("(vivid OR ornate) modern"), ["Pop Art", "Art Deco", "Art Nouveau"])
+        self.assertEqual(self.tags.query("NOT NOT vivid"), ["Pop Art"])
+    
+    def test_prefix_tags_and_category_filter(self):
+        self.assertEqual(self.tags.query("geo*"), ["Cubism", "Art Deco"])
+        self.assertEqual(self.tags.query("ornate", ["Abstract"]), ["Art Nouveau"])
+    
+    def test_tags_for_and_counts(self):
+        self.assertEqual(self.tags.tags_for("Art Deco"), ["geometric", "ornate"])
+        self.assertIn(("geometric", 2), self.tags.tags())
+    
+    def test_malformed_expressions(self):
+        for expression in ("(vivid", "vivid)", "AND vivid", "vivid OR", "NOT", "()"):
+            with self.subTest(expression=expression), self.assertRaises(ValueError):
+                self.tags.query(expression)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+"""Regression tests for StyleManager."""
+import os
+import sys
+import shutil
+import tempfile
+import time
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import style_manager
+from style_manager import StyleManager
+
+class RefreshCatalogTest(unittest.TestCase):
+    """Keeping the compiled catalog in sync with the Styles folder."""
+    
+    def setUp(self):
+        self.styles_folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.styles_folder)
+        for category, styles in (("Abstract", ["Cubism", "Fauvism"]), ("Nature", ["Forest"])):
+            with open(os.path.join(self.styles_folder, f"{category}.txt"), 'w', encoding='utf-8') as file:
+                file.write("\n".join(styles) + "\n")
+    
+    def test_deleted_category_file_is_dropped(self):
+        manager = StyleManager(self.styles_folder)
+        self.assertEqual(manager.get_styles_for_category("Nature"), ["Forest"])  # cached
+        
+        os.remove(os.path.join(self.styles_folder, "Nature.txt"))
+        self.assertEqual(manager.refresh_catalog(), ([], [], ["Nature"]))
+        self.assertNotIn("Nature", manager.get_categories())
+        self.assertEqual(manager.get_styles_for_category("Nature"), [])
+        
+        # A fresh manager reconciles the saved catalog with the folder on startup
+        reopened = StyleManager(self.styles_folder)
+        self.assertEqual(reopened.get_categories(), ["Abstract"])
+
+def wait_for(predicate, timeout=5.0):
+    """Poll predicate until it returns something truthy or timeout runs out."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        result = predicate()
+        if result:
+            return result
+        time.sleep(0.01)
+    return predicate()
+
+class RandomStyleTest(unittest.TestCase):
+    """Samplers are built off the calling thread and swapped in when ready."""
+    
+    def setUp(self):
+        self.styles_folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.styles_folder)
+        for category, styles in (("Abstract", ["Cubism", "Fauvism"]), ("Nature", ["Forest"])):
+            with open(os.path.join(self.styles_folder, f"{category}.txt"), 'w', encoding='utf-8') as file:
+                file.write("\n".join(styles) + "\n")
+        self.manager = StyleManager(self.styles_folder)
+    
+    def test_picks_come_from_the_catalog(self):
+        choice = wait_for(lambda: self.manager.get_random_style("size", avoid_recent=0))
+        self.assertIsNotNone(choice)
+        for _ in range(50):
+            style, category, position = self.manager.get_random_style("size", avoid_recent=0)
+            self.assertEqual(self.manager.get_styles_for_category(category)[position], style)
+    
+    def test_stale_sampler_is_served_until_rebuilt(self):
+        self.assertIsNotNone(wait_for(lambda: self.manager.get_random_style("favorites")))
+        old = self.manager._samplers["favorites"]
+        self.manager.add_favorite("Forest")
+        self.assertIsNotNone(self.manager.get_random_style("favorites"))  # old sampler, no wait
+        self.assertTrue(wait_for(lambda: self.manager._samplers["favorites"] is not old))
+        
+        picks = [self.manager.get_random_style("favorites", avoid_recent=0)[0] for _ in range(600)]
+        # Forest has weight 5 out of 7
+        self.assertGreater(picks.count("Forest"), 300)
+    
+    def test_unknown_weighting_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.manager.get_random_style("alphabetical")
+
+class CategoriesForStyleTest(unittest.TestCase):
+    """Looking up the categories that list a style."""
+    
+    def setUp(self):
+        self.styles_folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.styles_folder)
+        for category, styles in (("Abstract", ["Cubism", "Forest"]), ("Nature", ["Forest"])):
+            with open(os.path.join(self.styles_folder, f"{category}.txt"), 'w', encoding='utf-8') as file:
+                file.write("\n".join(styles) + "\n")
+        self.manager = StyleManager(self.styles_folder)
+    
+    def test_without_waiting_the_index_builds_in_the_background(self):
+        self.assertIsNone(self.manager._index)
+        self.assertEqual(self.manager.get_categories_for_style("Forest", wait=False), [])
+        self.assertEqual(wait_for(lambda: self.manager.get_categories_for_style("Forest", wait=False)),
+                         ["Abstract", "Nature"])
+    
+    def test_waiting_builds_the_index(self):
+        self.assertEqual(self.manager.get_categories_for_style("Cubism"), ["Abstract"])
+        self.assertEqual(self.manager.get_categories_for_style("Unknown"), [])
+
+class LockOrderTest(unittest.TestCase):
+    """Threads racing an index build must not deadlock."""
+    
+    def setUp(self):
+        self.styles_folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.styles_folder)
+        with open(os.path.join(self.styles_folder, "Abstract.txt"), 'w', encoding='utf-8') as file:
+            file.write("Cubism\nFauvism\n")
+    
+    def test_random_style_during_index_build(self):
+        manager = StyleManager(self.styles_folder)
+        building = threading.Event()
+        release = threading.Event()
+        real_index = style_manager.StyleIndex
+        
+        def slow_index(styles_by_category):
+            building.set()
+            release.wait(5)
+            return real_index(styles_by_category)
+        
+        with mock.patch.object(style_manager, "StyleIndex", side_effect=slow_index):
+            builder = threading.Thread(target=manager._get_index, daemon=True)
+            builder.start()
+            self.assertTrue(building.wait(5))
+            picker = threading.Thread(target=manager.get_random_style, daemon=True)
+            picker.start()
+            picker.join(0.2)  # let the picker block on the build
+            release.set()
+            builder.join(5)
+            picker.join(5)
+        
+        self.assertFalse(builder.is_alive(), "index build deadlocked")
+        self.assertFalse(picker.is_alive(), "get_random_style deadlocked")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+"""Tests for the Tk-free logic in ui_components."""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ui_components import PagedSequence, SearchableListbox
+
+class FakeVar:
+    def __init__(self, value=""):
+        self.value = value
+    
+    def get(self):
+        return self.value
+
+class FakeSearchWorker:
+    """Holds submitted queries so a test decides when their results arrive."""
+    
+    def __init__(self):
+        self.pending = []
+        self.cancelled = 0
+    
+    def submit(self, func, callback, *args):
+        self.pending.append((func, callback, args))
+    
+    def cancel(self):
+        self.cancelled += 1
+    
+    def deliver(self, position=0):
+        func, callback, args = self.pending.pop(position)
+        callback(func(*args))
+
+class FakeListbox:
+    def set_items(self, items):
+        self.items = list(items)
+
+def make_listbox(items, search_worker=None):
+    """A SearchableListbox without its Tk widgets."""
+    listbox = SearchableListbox.__new__(SearchableListbox)
+    listbox.items = items
+    listbox.filtered_items = list(items)
+    listbox.search_worker = search_worker
+    listbox.completer = None
+    listbox.search_var = FakeVar()
+    listbox.listbox = FakeListbox()
+    listbox._reset_filter_stack()
+    return listbox
+
+class SearchableListboxFilterTest(unittest.TestCase):
+    """Incremental filtering and its cached prefix stack."""
+    
+    def type(self, listbox, text):
+        listbox.search_var.value = text
+        listbox._on_search()
+    
+    def test_filter_narrows_and_widens(self):
+        listbox = make_listbox(["Cubism", "Cubist Portrait", "Forest", "Fauvism"])
+        self.type(listbox, "c")
+        self.type(listbox, "cub")
+        self.assertEqual(listbox.filtered_items, ["Cubism", "Cubist Portrait"])
+        self.type(listbox, "cubis")
+        self.type(listbox, "cubism")
+        self.assertEqual(listbox.filtered_items, ["Cubism"])
+        self.type(listbox, "cu")  # back to a cached prefix
+        self.assertEqual(listbox.filtered_items, ["Cubism", "Cubist Portrait"])
+        self.assertEqual([term for term, _ in listbox._filter_stack], ["", "c", "cu"])
+        self.type(listbox, "")
+        self.assertEqual(listbox.filtered_items, listbox.items)
+    
+    def test_stale_async_result_is_dropped(self):
+        worker = FakeSearchWorker()
+        items = [f"style {i}" for i in range(SearchableListbox.ASYNC_THRESHOLD)] + ["Cubism"]
+        listbox = make_listbox(items, worker)
+        self.type(listbox, "s")  # large base: queued on the worker
+        self.assertEqual(len(worker.pending), 1)
+        self.type(listbox, "")
+        self.type(listbox, "c")  # also large, queued too
+        worker.deliver(1)
+        self.assertEqual(listbox.filtered_items, ["Cubism"])
+        self.type(listbox, "cu")  # small base now: filtered inline
+        self.assertGreater(worker.cancelled, 0)
+        
+        worker.deliver(0)  # the result for "s" arrives late
+        self.assertEqual(listbox.filtered_items, ["Cubism"])
+        terms = [term for term, _ in listbox._filter_stack]
+        self.assertEqual(terms, ["", "c", "cu"])
+
+class PagedSequenceTest(unittest.TestCase):
+    """Fetching rows a page at a time."""
+    
+    def setUp(self):
+        self.source = list(range(500))
+        self.fetches = []
+        
+        def fetch(offset, limit):
+            self.fetches.append(offset)
+            return self.source[offset:offset + limit]
+        
+        self.sequence = PagedSequence(len(self.source), fetch)
+    
+    def test_pages_are_fetched_once(self):
+        self.assertEqual(self.sequence[5], 5)
+        self.assertEqual(self.sequence[-1], 499)
+        self.assertEqual(self.sequence[10:13], [10, 11, 12])
+        self.assertEqual(self.fetches, [0, 400])
+        with self.assertRaises(IndexError):
+            self.sequence[500]
+    
+    def test_length_is_clamped_when_the_source_shrinks(self):
+        del self.source[250:]  # history trimmed after the count was taken
+        with self.assertRaises(IndexError):
+            self.sequence[300]
+        self.assertEqual(len(self.sequence), 250)
+        self.assertEqual(self.sequence[249], 249)
+    
+    def test_slice_stops_at_the_rows_returned(self):
+        del self.source[250:]
+        self.assertEqual(self.sequence[240:260], list(range(240, 250)))
+        self.assertEqual(len(self.sequence), 250)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,11 @@
 """UI components module for MAT."""
 import tkinter as tk
+import tkinter.font as tkfont
 from tkinter import ttk, messagebox, filedialog
 import logging
-from typing import Callable, Optional, Dict, Any, List
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, Optional, Dict, Any, List, Sequence, Tuple
 
 class TooltipManager:
     """Manages tooltips for UI elements."""
@@ -70,14 +73,356 @@ class StatusBar:
         """Set progress bar value (0-100)."""
         self.progress['value'] = value
 
+class PagedSequence(Sequence):
+    """Read-only sequence that fetches its items a page at a time on demand.
+    
+    fetch(offset, limit) must return the items in that range; the most
+    recently used pages are kept, so scrolling back and forth is cheap.
+    If the source shrinks after the length was counted, a short page
+    clamps the length to the rows actually returned.
+    """
+    
+    PAGE_SIZE = 200
+    MAX_PAGES = 20
+    
+    def __init__(self, length: int, fetch: Callable[[int, int], List]):
+        self._length = length
+        self._fetch = fetch
+        self._pages: OrderedDict = OrderedDict()
+    
+    def __len__(self) -> int:
+        return self._length
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            items = []
+            for i in range(*index.indices(self._length)):
+                if i >= self._length:
+                    continue  # clamped while fetching
+                try:
+                    items.append(self[i])
+                except IndexError:
+                    continue
+            return items
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("PagedSequence index out of range")
+        
+        page_number, position = divmod(index, self.PAGE_SIZE)
+        page = self._pages.get(page_number)
+        if page is None:
+            page = self._pages[page_number] = self._fetch(page_number * self.PAGE_SIZE, self.PAGE_SIZE)
+            if len(self._pages) > self.MAX_PAGES:
+                self._pages.popitem(last=False)
+        else:
+            self._pages.move_to_end(page_number)
+        
+        if position >= len(page):
+            self._length = page_number * self.PAGE_SIZE + len(page)
+            for number in [n for n in self._pages if n > page_number]:
+                del self._pages[number]
+            raise IndexError("PagedSequence index out of range")
+        return page[position]
+
+class VirtualListbox:
+    """Listbox that only materializes the visible rows of a large item sequence.
+    
+    Indices passed to and returned from the selection methods refer to the
+    backing sequence, not to the rows currently shown in the Tk widget.
+    """
+    
+    OVERSCAN = 2
+    
+    def __init__(self, parent, formatter: Callable[[Any], str] = str, **listbox_options):
+        self.items: Sequence = []
+        self.formatter = formatter
+        self._first = 0
+        self._selected: Optional[int] = None
+        
+        self.frame = tk.Frame(parent, bg=listbox_options.get("bg", "black"))
+        self.listbox = tk.Listbox(self.frame, exportselection=False, **listbox_options)
+        self.scrollbar = tk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self._on_scrollbar)
+        
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        font = tkfont.Font(font=self.listbox.cget("font"))
+        self._line_height = font.metrics("linespace") + 2 * int(self.listbox.cget("selectborderwidth"))
+        
+        self.listbox.bind('<Configure>', lambda e: self._render())
+        self.listbox.bind('<<ListboxSelect>>', self._on_row_select)
+        self.listbox.bind('<MouseWheel>', lambda e: self._scroll_by(int(-1*(e.delta/120))))
+        self.listbox.bind('<Button-4>', lambda e: self._scroll_by(-1))
+        self.listbox.bind('<Button-5>', lambda e: self._scroll_by(1))
+        self.listbox.bind('<Up>', lambda e: self._move_selection(-1))
+        self.listbox.bind('<Down>', lambda e: self._move_selection(1))
+        self.listbox.bind('<Prior>', lambda e: self._move_selection(-self._visible_rows()))
+        self.listbox.bind('<Next>', lambda e: self._move_selection(self._visible_rows()))
+    
+    def pack(self, **kwargs):
+        """Pack the frame."""
+        self.frame.pack(**kwargs)
+    
+    def bind(self, sequence: str, func: Callable):
+        """Bind an event handler on the listbox, keeping internal handlers."""
+        self.listbox.bind(sequence, func, add="+")
+    
+    def set_items(self, items: Sequence):
+        """Replace the backing sequence and scroll back to the top."""
+        self.items = items
+        self._first = 0
+        self._selected = None
+        self._render()
+    
+    def size(self) -> int:
+        """Number of items in the backing sequence."""
+        return len(self.items)
+    
+    def curselection(self) -> Tuple[int, ...]:
+        """Backing index of the selected item, as a tuple like tk.Listbox."""
+        return () if self._selected is None else (self._selected,)
+    
+    def selection_clear(self, first=0, last=None):
+        """Clear the selection."""
+        self._selected = None
+        self.listbox.selection_clear(0, tk.END)
+    
+    def selection_set(self, index: int):
+        """Select the item at a backing index."""
+        if 0 <= index < len(self.items):
+            self._selected = index
+            self._render()
+    
+    def see(self, index: int):
+        """Scroll so that the item at a backing index is visible."""
+        rows = self._visible_rows()
+        if index < self._first:
+            self._first = index
+        elif index >= self._first + rows:
+            self._first = index - rows + 1
+        self._render()
+    
+    def nearest(self, y: int) -> int:
+        """Backing index of the row closest to a y coordinate."""
+        return self._first + self.listbox.nearest(y)
+    
+    def _visible_rows(self) -> int:
+        """Number of rows that fit in the widget."""
+        height = self.listbox.winfo_height()
+        if height <= 1:
+            return int(self.listbox.cget("height"))
+        return max(1, height // self._line_height)
+    
+    def _render(self):
+        """Materialize the rows in view and sync the scrollbar."""
+        total = len(self.items)
+        rows = self._visible_rows()
+        self._first = max(0, min(self._first, total - rows))
+        last = min(total, self._first + rows + self.OVERSCAN)
+        if self._selected is not None and self._selected >= total:
+            self._selected = None
+        
+        try:
+            texts = [self.formatter(self.items[i]) for i in range(self._first, last)]
+        except IndexError:
+            if len(self.items) < total:
+                self._render()  # a paged sequence found fewer rows than it counted
+                return
+            raise
+        
+        self.listbox.delete(0, tk.END)
+        if texts:
+            self.listbox.insert(0, *texts)
+        self.listbox.yview_moveto(0)
+        
+        if self._selected is not None and self._first <= self._selected < last:
+            self.listbox.selection_set(self._selected - self._first)
+        
+        if total:
+            self.scrollbar.set(self._first / total, min(1.0, (self._first + rows) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+    
+    def _scroll_by(self, rows: int):
+        """Scroll the view by a number of rows."""
+        self._first += rows
+        self._render()
+        return "break"
+    
+    def _on_scrollbar(self, action: str, amount: str, unit: str = "units"):
+        """Map scrollbar commands onto the backing sequence."""
+        if action == "moveto":
+            self._first = int(float(amount) * len(self.items))
+            self._render()
+        elif action == "scroll":
+            step = int(amount) * (self._visible_rows() if unit == "pages" else 1)
+            self._scroll_by(step)
+    
+    def _on_row_select(self, event):
+        """Track the backing index of a row clicked in the widget."""
+        selection = self.listbox.curselection()
+        if selection:
+            self._selected = self._first + selection[0]
+    
+    def _move_selection(self, delta: int):
+        """Move the selection with the keyboard, scrolling as needed."""
+        if not self.items:
+            return "break"
+        current = self._first - 1 if self._selected is None else self._selected
+        self._selected = max(0, min(len(self.items) - 1, current + delta))
+        self.see(self._selected)
+        self.listbox.event_generate('<<ListboxSelect>>')
+        return "break"
+
+class SearchWorker:
+    """Runs debounced searches on a background thread.
+    
+    Each submit() supersedes the previous query: a pending query is dropped
+    before it starts, a running one is left to finish but its result is
+    discarded. Results are delivered to the callback on the Tk thread by
+    polling with after(), so worker threads never touch Tk.
+    """
+    
+    POLL_INTERVAL = 15
+    
+    def __init__(self, widget, delay: int = 150):
+        self.widget = widget
+        self.delay = delay
+        self.logger = logging.getLogger(__name__)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mat-search")
+        self._generation = 0
+        self._debounce_timer = None
+        self._future: Optional[Future] = None
+    
+    def submit(self, func: Callable, callback: Callable, *args):
+        """Schedule func(*args) after the debounce delay; callback gets the result."""
+        self.cancel()
+        generation = self._generation
+        self._debounce_timer = self.widget.after(
+            self.delay, lambda: self._start(generation, func, args, callback))
+    
+    def cancel(self):
+        """Drop any pending or running query."""
+        self._generation += 1
+        if self._debounce_timer:
+            self.widget.after_cancel(self._debounce_timer)
+            self._debounce_timer = None
+        if self._future:
+            self._future.cancel()
+            self._future = None
+    
+    def shutdown(self):
+        """Stop the worker thread."""
+        self.cancel()
+        self._executor.shutdown(wait=False)
+    
+    def _start(self, generation: int, func: Callable, args: tuple, callback: Callable):
+        """Hand a debounced query to the thread pool."""
+        self._debounce_timer = None
+        if generation != self._generation:
+            return
+        self._future = self._executor.submit(func, *args)
+        self._poll(generation, self._future, callback)
+    
+    def _poll(self, generation: int, future: Future, callback: Callable):
+        """Deliver the result on the Tk thread once the query finishes."""
+        if generation != self._generation:
+            return
+        if not future.done():
+            self.widget.after(self.POLL_INTERVAL, lambda: self._poll(generation, future, callback))
+            return
+        
+        self._future = None
+        try:
+            result = future.result()
+        except Exception as e:
+            self.logger.error(f"Background search failed: {e}")
+            return
+        callback(result)
+
+class AutocompletePopup:
+    """Dropdown of suggestions shown under an Entry."""
+    
+    MAX_ROWS = 8
+    
+    def __init__(self, entry: tk.Entry, on_choose: Callable[[str], None]):
+        self.entry = entry
+        self.on_choose = on_choose
+        self.suggestions: List[str] = []
+        self.window = None
+        self.listbox = None
+    
+    def show(self, suggestions: List[str]):
+        """Show suggestions under the entry, or hide the popup if there are none."""
+        if not suggestions:
+            self.hide()
+            return
+        
+        if self.window is None:
+            self.window = tk.Toplevel(self.entry)
+            self.window.wm_overrideredirect(True)
+            self.listbox = tk.Listbox(self.window, bg="black", fg="green", font=("Arial", 10),
+                                      activestyle="none", exportselection=False)
+            self.listbox.pack(fill=tk.BOTH, expand=True)
+            self.listbox.bind("<ButtonRelease-1>", lambda e: self.choose())
+            self.listbox.bind("<Return>", lambda e: self.choose())
+            self.listbox.bind("<Escape>", lambda e: self.hide())
+            self.listbox.bind("<FocusOut>", lambda e: self.hide())
+        
+        self.suggestions = suggestions
+        self.listbox.delete(0, tk.END)
+        self.listbox.insert(tk.END, *suggestions)
+        self.listbox.config(height=min(len(suggestions), self.MAX_ROWS),
+                            width=max(20, max(len(s) for s in suggestions)))
+        self.window.wm_geometry(f"+{self.entry.winfo_rootx()}"
+                                f"+{self.entry.winfo_rooty() + self.entry.winfo_height()}")
+        self.window.deiconify()
+        self.window.lift()
+    
+    def hide(self):
+        """Hide the popup."""
+        if self.window is not None:
+            self.window.withdraw()
+        self.suggestions = []
+    
+    def is_visible(self) -> bool:
+        """Whether suggestions are currently shown."""
+        return bool(self.suggestions)
+    
+    def focus(self):
+        """Move keyboard focus to the first suggestion."""
+        if self.is_visible():
+            self.listbox.focus_set()
+            self.listbox.selection_clear(0, tk.END)
+            self.listbox.selection_set(0)
+            self.listbox.activate(0)
+    
+    def choose(self):
+        """Pick the selected suggestion."""
+        selection = self.listbox.curselection() if self.listbox else ()
+        if not selection:
+            return
+        suggestion = self.suggestions[selection[0]]
+        self.hide()
+        self.entry.focus_set()
+        self.on_choose(suggestion)
+
 class SearchableListbox:
     """Enhanced listbox with search functionality."""
     
-    def __init__(self, parent, items: List[str] = None, on_select: Callable = None):
+    # Lists at least this long are filtered on the search worker, if one is given
+    ASYNC_THRESHOLD = 20000
+    
+    def __init__(self, parent, items: List[str] = None, on_select: Callable = None,
+                 search_worker: Optional[SearchWorker] = None,
+                 completer: Optional[Callable[[str], List[str]]] = None):
         self.parent = parent
         self.items = items or []
         self.filtered_items = self.items.copy()
         self.on_select = on_select
+        self.search_worker = search_worker
+        self._reset_filter_stack()
         
         self.frame = tk.Frame(parent, bg="black")
         
@@ -87,19 +432,18 @@ class SearchableListbox:
                                    bg="black", fg="green", font=("Arial", 10))
         self.search_entry.pack(fill=tk.X, padx=2, pady=2)
         
-        # Listbox with scrollbar
-        listbox_frame = tk.Frame(self.frame, bg="black")
-        listbox_frame.pack(fill=tk.BOTH, expand=True, padx=2, pady=2)
-        
-        self.listbox = tk.Listbox(listbox_frame, bg="black", fg="green", 
-                                 font=("Arial", 10), selectmode=tk.SINGLE)
+        # Catalog-wide suggestions for the search text
+        self.completer = completer
+        self.autocomplete = AutocompletePopup(self.search_entry, self._on_complete)
+        if completer:
+            self.search_entry.bind("<Down>", lambda e: self.autocomplete.focus())
+            self.search_entry.bind("<Escape>", lambda e: self.autocomplete.hide())
+            self.search_entry.bind("<FocusOut>", self._on_entry_focus_out)
         
-        scrollbar = tk.Scrollbar(listbox_frame, orient=tk.VERTICAL, 
-                               command=self.listbox.yview)
-        self.listbox.configure(yscrollcommand=scrollbar.set)
-        
-        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        # Virtualized listbox with scrollbar
+        self.listbox = VirtualListbox(self.frame, bg="black", fg="green", 
+                                      font=("Arial", 10), selectmode=tk.SINGLE)
+        self.listbox.pack(fill=tk.BOTH, expand=True, padx=2, pady=2)
         
         # Bind events
         self.search_var.trace('w', self._on_search)
@@ -115,11 +459,18 @@ class SearchableListbox:
         """Place the frame."""
         self.frame.place(**kwargs)
     
-    def set_items(self, items: List[str]):
-        """Set listbox items."""
+    def set_items(self, items: List[str], formatter: Optional[Callable[[str], str]] = None):
+        """Set listbox items, optionally with a formatter for their display text."""
+        self.listbox.formatter = formatter or str
+        if self.search_worker:
+            self.search_worker.cancel()
         self.items = items
         self.filtered_items = items.copy()
-        self._populate_listbox()
+        self._reset_filter_stack()
+        if self.search_var.get():
+            self._on_search()
+        else:
+            self._populate_listbox()
     
     def get_selection(self) -> Optional[str]:
         """Get selected item."""
@@ -129,20 +480,80 @@ class SearchableListbox:
         return None
     
     def _on_search(self, *args):
-        """Handle search text change."""
+        """Handle search text change.
+        
+        Filtering is incremental: a query that extends an earlier one only
+        scans that query's matches, and deleting characters falls back to
+        the cached results of the longest remaining prefix. Large scans run
+        on the search worker when one is available.
+        """
         search_term = self.search_var.get().lower()
-        if search_term:
-            self.filtered_items = [item for item in self.items 
-                                 if search_term in item.lower()]
+        if self.completer and self.search_entry.focus_get() is self.search_entry:
+            self.autocomplete.show(self.completer(search_term))
+        
+        while len(self._filter_stack) > 1 and not search_term.startswith(self._filter_stack[-1][0]):
+            self._filter_stack.pop()
+        
+        base_term, base_indices = self._filter_stack[-1]
+        if search_term == base_term:
+            if self.search_worker:
+                self.search_worker.cancel()
+            self._show_filtered(base_indices)
+        elif self.search_worker and len(base_indices) >= self.ASYNC_THRESHOLD:
+            self.search_worker.submit(
+                self._filter_indices,
+                lambda indices: self._push_filter(search_term, indices),
+                base_indices, search_term)
         else:
-            self.filtered_items = self.items.copy()
+            if self.search_worker:
+                self.search_worker.cancel()
+            self._push_filter(search_term, self._filter_indices(base_indices, search_term))
+    
+    def _filter_indices(self, base_indices, search_term: str) -> List[int]:
+        """Indices from base_indices whose item contains search_term."""
+        lowered = self._lowered_items
+        return [i for i in base_indices if search_term in lowered[i]]
+    
+    def _push_filter(self, search_term: str, indices: List[int]):
+        """Cache a query's matches and show them, unless the query is out of date.
+        
+        Each cached query must extend the one below it and be a prefix of
+        the search text, or later queries would filter the wrong base.
+        """
+        current_term = self.search_var.get().lower()
+        if (not current_term.startswith(search_term)
+                or not search_term.startswith(self._filter_stack[-1][0])):
+            return
+        self._filter_stack.append((search_term, indices))
+        if search_term == current_term:
+            self._show_filtered(indices)
+    
+    def _show_filtered(self, indices):
+        """Show the items at the given indices."""
+        self.filtered_items = [self.items[i] for i in indices]
         self._populate_listbox()
     
+    def _reset_filter_stack(self):
+        """Reset cached filter results after the item list changes."""
+        self._lowered_items = [item.lower() for item in self.items]
+        self._filter_stack = [("", range(len(self.items)))]
+    
     def _populate_listbox(self):
         """Populate listbox with filtered items."""
-        self.listbox.delete(0, tk.END)
-        for item in self.filtered_items:
-            self.listbox.insert(tk.END, item)
+        self.listbox.set_items(self.filtered_items)
+    
+    def _on_complete(self, suggestion: str):
+        """Select a suggested style, which may come from another category."""
+        if self.on_select:
+            self.on_select(suggestion)
+    
+    def _on_entry_focus_out(self, event):
+        """Hide suggestions unless focus moved into them."""
+        def hide_if_unfocused():
+            focus = self.search_entry.focus_get()
+            if focus is not self.autocomplete.listbox and focus is not self.search_entry:
+                self.autocomplete.hide()
+        self.search_entry.after(100, hide_if_unfocused)
     
     def _on_listbox_select(self, event):
         """Handle listbox selection."""
@@ -170,6 +581,14 @@ class TabManager:
         """Get tab widget by name."""
         return self.tabs.get(name)
     
+    def get_selected_tab(self) -> Optional[str]:
+        """Get the name of the selected tab."""
+        try:
+            selected = self.notebook.select()
+        except tk.TclError:
+            return None
+        return next((name for name, widget in self.tabs.items() if str(widget) == selected), None)
+    
     def select_tab(self, name: str) -> bool:
         """Select tab by name."""
         if name in self.tabs: